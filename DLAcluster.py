@@ -1,7 +1,9 @@
 """
 DLACluster.py - this is the main function for the DLA cluster model.
 
-INPUTS: DLACluster(squareSize, needGif, blockNumber, layerStep, tempProb, seedNum, alignProb, depMod, clusterMod)
+INPUTS: DLACluster(squareSize, needGif, blockNumber, layerStep, tempProb, seedNum, alignProb, depMod, clusterMod, engine, batchSize, launch, launchGap, jumpAhead, seed, analysis,
+                   renderer, imageUpscale, imageDownsample, frameCap, frameStride, historyPath, historyAt,
+                   checkpointPath, checkpointSeconds, checkpointLayers, eventLog, stepHistogram, progress, hooks, resume)
 
 squareSize: dimensions of simulation square (int)
 needGif: determines if GIF is produced (boolean)
@@ -12,12 +14,64 @@ seedNum: number of seed particles in the simulation (int)
 alignProb: probability of deposition for non-aligned particles (float)
 depMod: moderating factor in surface-normal deposition (float)
 clusterMod: moderating factor in on-cluster deposition (float)
+engine: 'serial' releases one walker at a time, 'batch' advances a pool of
+        walkers at once with walkerEngine.py (str)
+batchSize: number of walkers in the pool of the batched engine (int)
+launch: 'edge' releases walkers near the top, left or right edge of the
+        square, 'shell' releases them on a line just above the highest column
+        top (cluster or solid silica, see columnTops.py) and re-injects
+        walkers that wander too far (str)
+launchGap: distance between the highest column top and the launch line (int)
+jumpAhead: walkers far from any obstacle jump ahead using the distance
+           field of distanceField.py (bool)
+seed: seed of the random number generator, so that a run can be repeated
+      exactly - None (fresh entropy), int or SeedSequence (see rngStreams.py)
+analysis: 'background' analyses each layer in a worker thread while the
+          walkers keep walking, 'inline' analyses it before they go on (str,
+          see layerAnalysis.py)
+renderer: 'lattice' maps lattice codes straight to the snapshot colours and
+          writes indexed PNG files in a writer thread, 'matplotlib' draws
+          them with matshow (str, see latticeImage.py)
+imageUpscale: pixels per site along each side of a snapshot (int)
+imageDownsample: sites per pixel along each side of a snapshot (int)
+frameCap: largest number of frames in the GIF, None for no limit (int)
+frameStride: number of snapshots per frame of the GIF (int)
+historyPath: directory where the lattice is recorded after every layer or
+             snapshot, None for no history (str, see frameHistory.py)
+historyAt: 'layer' or 'snapshot' - when the lattice is recorded (str)
+checkpointPath: file where the state of the run is saved, None for no
+                checkpoints (str, see checkpoint.py)
+checkpointSeconds: wall-clock time between checkpoints (float)
+checkpointLayers: number of layers between checkpoints (int)
+eventLog: file where every deposition is logged, None for no log (str, see
+          eventLog.py)
+stepHistogram: count the steps of every walker in the statistics of the run
+               (the batched engine then keeps the steps of every walker in
+               its pool) (bool)
+progress: called with a record of the progress of the run (after every
+          layer, every 500 walkers and when the run stops), None for no
+          progress - printProgress prints it (function, see runStats.py)
+hooks: callbacks on the events of the run (walker launched, particle
+       deposited, layer added, islands counted, run finished), None for no
+       callbacks (HookRegistry, see simulationHooks.py)
+resume: state of a run saved at a checkpoint, to continue it - see
+        resumeCluster in checkpoint.py (dict)
 
 OUTPUTS:
 
 mass: number of particles added to metal oxide cluster (int)
-clusterRadius: distance from seed origin to furthest particle in cluster (float)
+clusterRadius: distance from seed origin to furthest particle in cluster,
+               largest over all seeds (float)
+clusterArea: area of the bounding box of the cluster (int)
 matrix: final matrix representation of the simulation (array)
+islands: number of islands in the simulation (int)
+history: mass, radius, radius of gyration and bounding box of the cluster
+         after every deposition (dict of arrays, see clusterGeometry.py)
+layers: islands, surface roughness and cluster geometry after every layer
+        (dict of arrays, see layerAnalysis.py)
+stats: time spent in every phase of the run, fates of the walkers,
+       acceptance of depositions and steps per walker (RunStats, see
+       runStats.py)
 
 Aligments: 1 == north
            2 == east
@@ -25,27 +79,56 @@ Aligments: 1 == north
            4 == west
 """
 
-import random
 import math
 import numpy
-import matplotlib.pyplot as plt
 import os
-from matplotlib import colors
-from checkAround import checkAround
-from randomAtSurface import randomAtSurface
+import time
+from functools import partial
+from checkAround import neighbourOffsets, alignedCells
+from randomAtSurface import randomAtSurface, randomOnShell, reinjectOnShell, killHeight, awayFromEdge
 from addLayer import addLayer
-import countIslands
+from walkerEngine import advanceWalkers, poolSites, dropBuried
+from distanceField import distanceField, depositField, updateField
+from stepKernel import walkWalker, DirectionBuffer, edgeMask, foundFriend, nearEdge, inSolid, aboveKill
+from rngStreams import makeGenerator, RandomBlock
+from clusterGeometry import seedLattice, depositRadius, newGeometry, depositGeometry, recordGeometry, historyArrays
+import clusterGeometry
+import columnTops
+from latticeState import newLattice
+from layerFront import newFront
+from layerAnalysis import LayerPipeline
+from frameHistory import HistoryWriter
+from latticeImage import indexedFrame, FrameWriter, AnimationWriter, figureFrame
+from checkpoint import CheckpointClock, saveCheckpoint, rngState, restoreRng
+from eventLog import EventLog
+from runStats import RunStats, printProgress
 
 # Main simulation script (DLA-CA Process)
-def DLAcluster(squareSize, needGif, blockNumber, layerStep, tempProb, seedNum, alignProb, depMod, clusterMod):
+def DLAcluster(squareSize, needGif, blockNumber, layerStep, tempProb, seedNum, alignProb, depMod, clusterMod,
+               engine='serial', batchSize=4096, launch='edge', launchGap=5, jumpAhead=False, seed=None, analysis='background',
+               renderer='lattice', imageUpscale=1, imageDownsample=1, frameCap=None, frameStride=1,
+               historyPath=None, historyAt='layer', checkpointPath=None, checkpointSeconds=None, checkpointLayers=None,
+               eventLog=None, stepHistogram=False, progress=printProgress, hooks=None, resume=None):
+
+    # Arguments of the run, saved in its checkpoints
+    arguments = dict(locals())
+    del arguments['resume'], arguments['progress'], arguments['hooks']
+
+    # Time per phase and fates of the walkers
+    stats = RunStats(stepHistogram)
+    runStart = time.perf_counter()
+    if resume is not None:
+        vars(stats).update(vars(resume['stats']))
+
+    # Random number generator of the run, passed to every module
+    rng = RandomBlock(makeGenerator(seed))
 
     # Check if folder "images" exists, and if not - create it
     if not os.path.isdir("images"):
         os.mkdir("images")
-    # Create GIF of formation process
+    # Create GIF of formation process, frames streamed into it by a writer thread
     if needGif:
-        # Import imagio if intend to save gif
-        import imageio
+        animation = AnimationWriter("images/movie.gif", frameCap=frameCap, frameStride=frameStride, resume=resume['animation'] if resume is not None else None)
 
     if seedNum > 1:
         # Evenly spaced x coordinates between (squareSize/4, 3*squareSize/4)
@@ -57,19 +140,20 @@ def DLAcluster(squareSize, needGif, blockNumber, layerStep, tempProb, seedNum, a
     seedY = numpy.ones(seedNum, dtype=int)
     # Location of seed particle
     seedLocation = [seedX, seedY]
+    # Seed of every cluster particle and radius of the cluster grown from each seed
+    seedMatrix, seedRadii = seedLattice(squareSize, seedX, seedY)
+    # Running bounding box and sums for the radius of gyration, sampled after every deposition
+    geometry = newGeometry(seedX, seedY)
+    history = {}
     # Matrix represents square
-    matrix = numpy.zeros((squareSize, squareSize))
+    matrix = newLattice(squareSize)
     # KPZ Matrix for surface construction
-    KPZMatrix = numpy.zeros((squareSize, squareSize))
+    KPZMatrix = newLattice(squareSize)
     # Matrix of crystallographic alignments
-    alignMatrix = numpy.zeros((squareSize, squareSize))
-
-    # Set initial matrix conditions
-    for row in range (0, squareSize):
-        for col in range (0, squareSize):
-            if row == 0:
-                # Bottom row is solid silica
-                matrix[row][col] = 3
+    alignMatrix = newLattice(squareSize)
+
+    # Set initial matrix conditions - bottom row is solid silica
+    matrix[0, :] = 3
     # Place seed particles on 1st row of matrix
     for i in range (len(seedX)):
         y = int(seedY[i])
@@ -78,8 +162,6 @@ def DLAcluster(squareSize, needGif, blockNumber, layerStep, tempProb, seedNum, a
         # Assign random crystallographic orientation to seed
         alignMatrix[y][x] = 3
 
-    cmap = colors.ListedColormap(['navy','white','orange','green','black'], N=5)
-
     # Initialize the random walker counter
     randomWalkersCount = 0
 
@@ -95,281 +177,357 @@ def DLAcluster(squareSize, needGif, blockNumber, layerStep, tempProb, seedNum, a
     # Initialize variable for number of added layers
     existingLayers = 0
 
-    # Initialize array for the used interval for graphing
-    usedInterval = []
-
-    # Add initial KPZ Layer to the simulation (Cavity edge)
-    KPZMatrix, existingLayers = addLayer(KPZMatrix, matrix, blockNumber, squareSize, existingLayers, tempProb, depMod, clusterMod)
-    for i in range (1, squareSize - 2):
-        for j in range (1, squareSize - 1):
-            if matrix[i][j] != 1 and i != 0:
-                matrix[i][j] = KPZMatrix[i][j]
-    islands = countIslands.countIslands(matrix.tolist(), squareSize)
-    print("Layer added, number of islands = ", str(islands))
+    # Pool of walkers for the batched engine
+    walkers = None
+
+    # Sites on the active front of layer growth
+    front = newFront(KPZMatrix, matrix, squareSize)
+    # Topmost layer and non-gel sites of every column, for the stop conditions
+    tops = columnTops.columnTops(matrix, squareSize)
+    # Analyses of every layer (islands, roughness, geometry) on snapshots of the matrix
+    pipeline = LayerPipeline(squareSize, geometry, seedRadii, analysis == 'background', stats, progress, hooks)
+    # State of the run passed to the callbacks of the hooks (references, not copies)
+    state = {'matrix': matrix, 'KPZMatrix': KPZMatrix, 'alignMatrix': alignMatrix, 'seedMatrix': seedMatrix, 'geometry': geometry,
+             'seedRadii': seedRadii, 'history': history, 'tops': tops, 'field': None, 'stats': stats}
+
+    if resume is None:
+        # Add initial KPZ Layer to the simulation (Cavity edge)
+        start = time.perf_counter()
+        KPZMatrix, existingLayers, surfaceAtEdge, clusterNotEnclosed = simulationLayer(KPZMatrix, matrix, blockNumber, squareSize, existingLayers, tempProb, depMod, clusterMod, rng, tops, front=front, pipeline=pipeline)
+        stats.lap('layer', start)
+        if hooks is not None and hooks.active:
+            hooks.call('layerAdded', state, existingLayers, addedCount)
+    else:
+        # Continue the run from its checkpoint (arrays and running sums
+        # shared with the layer analyses are restored in place)
+        for array, name in [(matrix, 'matrix'), (KPZMatrix, 'KPZMatrix'), (alignMatrix, 'alignMatrix'), (seedMatrix, 'seedMatrix')]:
+            array[...] = resume[name]
+        for name in tops:
+            tops[name][...] = resume['tops'][name]
+        front.update(resume['front'])
+        seedRadii[:] = resume['seedRadii']
+        geometry.update(resume['geometry'])
+        history.update(resume['history'])
+        addedCount, existingLayers, randomWalkersCount, newAddedCount = resume['counters']
+        walkers = resume['walkers']
+        pipeline.restore(resume['pipeline'])
+
+    # Lattice recorded on disk after every layer (or snapshot), from the initial layer on
+    frames = None
+    if historyPath is not None:
+        frames = HistoryWriter(historyPath, squareSize, resume=resume['frames'] if resume is not None else None)
+        if resume is None:
+            frames.record(matrix, alignMatrix, randomWalkersCount, addedCount, existingLayers)
+    recordedLayers = existingLayers
+    # Log of every deposition
+    events = EventLog(eventLog, resume=resume['events'] if resume is not None else None) if eventLog is not None else None
+
+    # Distance from each site to the nearest obstacle for jumping walkers
+    field = distanceField(matrix, squareSize) if jumpAhead else None
+    if field is not None and resume is not None:
+        field[...] = resume['field']
+    state['field'] = field
+
+    # Flat views of the matrix and field, and random directions, for the stepping kernel
+    cells = memoryview(matrix.reshape(-1))
+    fieldCells = memoryview(field.reshape(-1)) if field is not None else None
+    edge = edgeMask(squareSize)
+    directions = DirectionBuffer(rng)
+    if resume is not None:
+        restoreRng(rng, directions, resume['rng'])
+
+    # Checkpoints every checkpointSeconds or checkpointLayers layers
+    clock = CheckpointClock(checkpointSeconds, checkpointLayers, existingLayers) if checkpointPath is not None else None
 
     # Simulation stops when cluster or surfaces touch top of the square
     while not completeCluster and not completeSurface:
 
-        # Release a walker
-        randomWalkersCount += 1
-        random.seed()
-
-        # Generate an initial position for a walker on the surface of the square
-        location = randomAtSurface(squareSize)
-
-        # Initialize variables for finding friend / leaving square / cluster reaching surface / layers reaching surface / walker in solid / cluster enclosed
-        foundFriend = False # Not near other particle
-        nearEdge = False # Not near the edge of the square
-        topSquare = False # Cluster not at edge of the square
+        # Save the state of the run between two iterations (see checkpoint.py)
+        if clock is not None and clock.due(existingLayers):
+            start = time.perf_counter()
+            stats.elapsed += start - runStart
+            runStart = start
+            saveCheckpoint(checkpointPath, {'arguments': arguments, 'matrix': matrix, 'KPZMatrix': KPZMatrix, 'alignMatrix': alignMatrix,
+                                            'seedMatrix': seedMatrix, 'front': front, 'tops': tops, 'seedRadii': seedRadii,
+                                            'geometry': geometry, 'history': history, 'field': field, 'walkers': walkers,
+                                            'counters': (addedCount, existingLayers, randomWalkersCount, newAddedCount),
+                                            'rng': rngState(rng, directions), 'pipeline': pipeline.state(),
+                                            'animation': animation.state() if needGif else None,
+                                            'frames': frames.state() if frames is not None else None,
+                                            'events': events.state() if events is not None else None, 'stats': stats})
+            clock.reset(existingLayers)
+            stats.lap('checkpoint', start)
+
+        # Walkers released before this iteration
+        previousWalkersCount = randomWalkersCount
+
+        # Initialize variables for layers reaching surface / cluster enclosed
         surfaceAtEdge = False # Surface not at edge of square
-        inSolid = False # Particle not in solid silica
         clusterNotEnclosed = True # Cluster is not completely enclosed in silica
 
-        # Set an individual walker out, stop if found a neighbouring particle, give up if it reached the edge of the simulation area
-        while (not foundFriend) and (not nearEdge) and (not inSolid) and (not surfaceAtEdge) and (clusterNotEnclosed):
-            # Run the walking function
-            locationNew, foundFriend, nearEdge, orientation = checkAround(location, squareSize, matrix)
-                                    
-            # Add layer to simulation if 'layerStep' particles newly added to simulation 
+        if engine == 'batch':
+            # Advance the pool of walkers by one step
+            start = time.perf_counter()
+            watching = hooks is not None and hooks.active
+            quota = layerStep - addedCount%layerStep
+            launchHeight = min(columnTops.coverTop(tops) + launchGap, squareSize - 6) if launch == 'shell' else None
+            # Walkers are kept track of only for the event log, the steps histogram or the hooks
+            walkerCount = randomWalkersCount if events is not None or stepHistogram or watching else None
+            walkers, released, depositY, depositX, deposits = advanceWalkers(walkers, matrix, alignMatrix, squareSize, alignProb, batchSize, quota, rng, launchHeight, field, walkerCount, stats,
+                                                                             partial(hooks.call, 'launched', state) if watching else None)
+            randomWalkersCount += released
+            addedCount += len(depositX)
+
+            # Attribute new particles to seeds (in order of release)
+            for i in range(len(depositX)):
+                depositRadius(seedMatrix, seedRadii, seedX, int(depositX[i]), int(depositY[i]))
+                depositGeometry(geometry, int(depositX[i]), int(depositY[i]))
+                columnTops.depositTops(tops, matrix, int(depositX[i]), int(depositY[i]))
+                pipeline.deposit(int(depositY[i]))
+                recordGeometry(history, geometry, addedCount - len(depositX) + i + 1, max(seedRadii))
+                if watching:
+                    hooks.call('deposited', state, int(deposits['index'][i]), int(depositX[i]), int(depositY[i]), addedCount - len(depositX) + i + 1)
+            if events is not None and len(depositX) > 0:
+                events.logMany(deposits['index'], depositX, depositY, deposits['alignment'], deposits['orientation'], deposits['steps'], existingLayers)
+            # Cluster reaches edge of constant radius
+            if numpy.any((depositY**2 + (depositX - squareSize/2)**2)**(1/2) > (squareSize/2 - 5)):
+                completeCluster = True
+            start = stats.lap('walk', start)
+
+            # Add layer to simulation if 'layerStep' particles newly added to simulation
+            if len(depositX) > 0 and addedCount%layerStep == 0:
+                sites = poolSites(walkers, matrix)
+                KPZMatrix, existingLayers, surfaceAtEdge, clusterNotEnclosed = simulationLayer(KPZMatrix, matrix, blockNumber, squareSize, existingLayers, tempProb, depMod, clusterMod, rng, tops, field, front, pipeline)
+                # Walkers buried by the layer (or inside it) leave the pool
+                walkers = dropBuried(walkers, sites, matrix, stats)
+                stats.lap('layer', start)
+                if watching:
+                    hooks.call('layerAdded', state, existingLayers, addedCount)
+
+        else:
+            # Release a walker (callbacks looked up only if there are any)
+            randomWalkersCount += 1
+            watching = hooks is not None and hooks.active
+
+            # Add layer to simulation if 'layerStep' particles newly added to simulation
             if addedCount%layerStep == 0 and addedCount != 0 and newAddedCount == True:
-                KPZMatrix, existingLayers = addLayer(KPZMatrix, matrix, blockNumber, squareSize, existingLayers, tempProb, depMod, clusterMod)
-                for i in range (1, squareSize - 2):
-                    for j in range (1, squareSize - 1):
-                        if matrix[i][j] != 1 and i != 0:
-                            matrix[i][j] = KPZMatrix[i][j]
-                # Count matrix 'islands' for measure of anastomosis
-                islands = countIslands.countIslands(matrix.tolist(), squareSize)
-                print("Layer added, number of islands = ", str(islands))
-                
-                # Check if surface near top of square
-                for i in range(squareSize - 15, squareSize - 1):
-                    for j in range (0, squareSize - 1):
-                        if matrix[i][j] == (2 or 3 or 4):
-                            surfaceAtEdge = True
-
-                # Check if cluster is enclosed
-                indexList = []
-                for i in range(0, squareSize - 1):
-                    for j in range(squareSize - 1, 0, -1):
-                        if matrix[j][i] != 0 and matrix[j][i] != 4:
-                            indexList.append(matrix[j][i])
-                            break
-
-                # If cluster not enclosed by layer - continue
-                if 1 not in indexList:
-                    clusterNotEnclosed = False
-                              
-        
+                start = time.perf_counter()
+                KPZMatrix, existingLayers, surfaceAtEdge, clusterNotEnclosed = simulationLayer(KPZMatrix, matrix, blockNumber, squareSize, existingLayers, tempProb, depMod, clusterMod, rng, tops, field, front, pipeline)
+                stats.lap('layer', start)
+                if watching:
+                    hooks.call('layerAdded', state, existingLayers, addedCount)
+                newAddedCount = False
+
+            start = time.perf_counter()
+            # Generate an initial position for a walker on the surface of the square
+            killStart = None
+            if launch == 'shell':
+                # Release on the launch line and re-inject above the kill height
+                launchHeight = min(columnTops.coverTop(tops) + launchGap, squareSize - 6)
+                killLine = killHeight(squareSize, launchHeight)
+                if killLine > launchHeight:
+                    killStart = (killLine + 1)*squareSize
+                x, y = randomOnShell(squareSize, launchHeight, matrix, 1, rng)
+                location = [int(x[0]), int(y[0])]
+            else:
+                location = randomAtSurface(squareSize, rng=rng)
+            if watching:
+                hooks.call('launched', state, randomWalkersCount, location[0], location[1])
+
+            # Set an individual walker out, stop if found a neighbouring particle, give up if it reached the edge of the simulation area
+            event = nearEdge
+            if (not surfaceAtEdge) and (clusterNotEnclosed):
+                position = location[1]*squareSize + location[0]
+                event = aboveKill
+                walkSteps = 0
+                while event == aboveKill:
+                    # Walk until the walker stops (see stepKernel.py)
+                    position, event, orientation, steps = walkWalker(position, cells, edge, squareSize, directions, rng, fieldCells, killStart)
+                    walkSteps += steps
+                    if event == aboveKill:
+                        stats.fate('reinjected')
+                        x, y, valid = reinjectOnShell(numpy.array([position%squareSize]), numpy.array([position//squareSize]), squareSize, launchHeight, matrix, rng)
+                        position = int(y[0])*squareSize + int(x[0])
+                        # Walker re-injected near (or off) the edge, or into solid silica
+                        if not valid[0]:
+                            event = inSolid if awayFromEdge(x, y, squareSize)[0] else nearEdge
+                location = [position%squareSize, position//squareSize]
+                if stepHistogram:
+                    stats.walker(walkSteps)
+                if event != foundFriend:
+                    stats.fate('nearEdge' if event == nearEdge else 'inSolid')
+
             # Add to the cluster if neighbouring a particle in the cluster
-            if foundFriend:
+            if event == foundFriend:
                 # Randomly choose crystalographic aligment of walker
-                cell = random.choice([1, 2, 3, 4])
+                cell = 1 + int(rng.random()*4)
                 # Number to determine deposition of non-aligned particles
-                marker = random.uniform(0,1)
+                marker = rng.random()
                 # Current location not near top of square, replace with 1 and stop
-                if matrix[location[1]][location[0]] == 4 and location[1] < (squareSize - 5) :
-                    if orientation == 'down':
-                        # Walker aligned with nearest neighbour
-                        if alignMatrix[location[1] + 1][location[0]] == cell and cell == 1:
-                            matrix[location[1]][location[0]] = 1
-                            # Update matrix of alignments
-                            alignMatrix[location[1]][location[0]] = cell
-                            addedCount += 1
-                            newAddedCount = True
-                        # If not aligned - deposition is stochastic
-                        else:
-                            if marker < alignProb:
-                                matrix[location[1]][location[0]] = 1
-                                # Update matrix of alignments
-                                alignMatrix[location[1]][location[0]] = cell
-                                addedCount += 1
-                                newAddedCount = True
-                    elif orientation == 'up':
-                        # Walker aligned with nearest neighbour
-                        if alignMatrix[location[1] - 1][location[0]] == cell and cell == 3:
-                            matrix[location[1]][location[0]] = 1
-                            # Update matrix of alignments
-                            alignMatrix[location[1]][location[0]] = cell
-                            addedCount += 1
-                            newAddedCount = True
-                        # If not aligned - deposition is stochastic
-                        else:
-                            if marker < alignProb:
-                                matrix[location[1]][location[0]] = 1
-                                alignMatrix[location[1]][location[0]] = cell
-                                addedCount += 1
-                                newAddedCount = True
-                    elif orientation == 'left':
-                        # Walker aligned with nearest neighbour
-                        if alignMatrix[location[1]][location[0] - 1] == cell and cell == 2:
-                            matrix[location[1]][location[0]] = 1
-                            # Update matrix of alignments
-                            alignMatrix[location[1]][location[0]] = cell
-                            addedCount += 1
-                            newAddedCount = True
-                        # If not aligned - deposition is stochastic
-                        else:
-                            if marker < alignProb:
-                                matrix[location[1]][location[0]] = 1
-                                # Update matrix of alignments
-                                alignMatrix[location[1]][location[0]] = cell
-                                addedCount += 1
-                                newAddedCount = True
-                    elif orientation == 'right':
-                        # Walker aligned with nearest neighbour
-                        if alignMatrix[location[1]][location[0] + 1] == cell and cell == 4:
-                            matrix[location[1]][location[0]] = 1
-                            # Update matrix of alignments
-                            alignMatrix[location[1]][location[0]] = cell
-                            addedCount += 1
-                            newAddedCount = True
-                        # If not aligned - deposition is stochastic
-                        else:
-                            if marker < alignProb:
-                                matrix[location[1]][location[0]] = 1
-                                # Update matrix of alignments
-                                alignMatrix[location[1]][location[0]] = cell
-                                addedCount += 1
-                                newAddedCount = True
-
-                    # Finish conditions for non-constant radius
-                    """
-                    # Cluster touches top of square   
-                    for i in range(squareSize - 10, squareSize):
-                        for j in range (0, squareSize):
-                            if matrix[i][j] == 1:
-                                completeCluster = True
-
-                    # Cluster touches RHS of square
-                    for i in range(0, squareSize):
-                        for j in range (squareSize - 5, squareSize):
-                            if matrix[i][j] == 1:
-                                completeCluster = True
-
-                    # Cluster touches LHS of square
-                    for i in range(0, squareSize):
-                        for j in range (0, 5):
-                            if matrix[i][j] == 1:
-                                completeCluster = True
-                    """
-                    
-                    for i in range(squareSize):
-                        for j in range(squareSize):
-                            if matrix[i][j] == 1 and (i**2 + (j-squareSize/2)**2)**(1/2) > (squareSize/2 - 5):
-                                completeCluster = True
-                    
-                    
-            # Otherwise, save the location
-            else:
-                # Forbid walking through solid silica
-                if matrix[locationNew[1]][locationNew[0]] == (2 or 3 or 6):
-                    inSolid = True
+                if matrix[location[1]][location[0]] == 4 and location[1] < (squareSize - 5):
+                    # Walker aligned with nearest neighbour, otherwise deposition is stochastic
+                    dy, dx = neighbourOffsets[orientation]
+                    aligned = alignMatrix[location[1] + dy][location[0] + dx] == cell and cell == alignedCells[orientation]
+                    if aligned or marker < alignProb:
+                        stats.fate('aligned' if aligned else 'unaligned')
+                        matrix[location[1]][location[0]] = 1
+                        # Update matrix of alignments
+                        alignMatrix[location[1]][location[0]] = cell
+                        addedCount += 1
+                        newAddedCount = True
+
+                        # Finish conditions for non-constant radius
+                        """
+                        # Cluster touches top of square   
+                        for i in range(squareSize - 10, squareSize):
+                            for j in range (0, squareSize):
+                                if matrix[i][j] == 1:
+                                    completeCluster = True
+
+                        # Cluster touches RHS of square
+                        for i in range(0, squareSize):
+                            for j in range (squareSize - 5, squareSize):
+                                if matrix[i][j] == 1:
+                                    completeCluster = True
+
+                        # Cluster touches LHS of square
+                        for i in range(0, squareSize):
+                            for j in range (0, 5):
+                                if matrix[i][j] == 1:
+                                    completeCluster = True
+                        """
+
+                        # Update radius of the seed the particle grew from
+                        depositRadius(seedMatrix, seedRadii, seedX, location[0], location[1])
+                        depositGeometry(geometry, location[0], location[1])
+                        columnTops.depositTops(tops, matrix, location[0], location[1])
+                        pipeline.deposit(location[1])
+                        recordGeometry(history, geometry, addedCount, max(seedRadii))
+                        if events is not None:
+                            events.log(randomWalkersCount, location[0], location[1], cell, orientation, walkSteps, existingLayers)
+                        if watching:
+                            hooks.call('deposited', state, randomWalkersCount, location[0], location[1], addedCount)
+                        # Cluster reaches edge of constant radius (only the new particle can)
+                        if (location[1]**2 + (location[0] - squareSize/2)**2)**(1/2) > (squareSize/2 - 5):
+                            completeCluster = True
+
+                        # Deposited particle is a new obstacle for jumping walkers
+                        if field is not None:
+                            depositField(field, location[0], location[1], squareSize)
+                    else:
+                        stats.fate('rejected')
                 else:
-                    location = locationNew
-                    newAddedCount = False
+                    stats.fate('blocked')
+            stats.lap('walk', start)
         
-        # Print update 
-        intervalSavePic=range(2,4000000000,500)
-        if randomWalkersCount in intervalSavePic:
-            """
-            print("Walkers added: ", randomWalkersCount, " Walkers added to cluster: ", addedCount)
-            """
+        # Report progress (once per 500 walkers, also when a batch releases several)
+        savePic = randomWalkersCount >= 2 and (randomWalkersCount - 2)//500 > (previousWalkersCount - 2)//500
+        if savePic and progress is not None:
+            pipeline.dispatch()
+            progress({'event': 'snapshot', 'walkers': randomWalkersCount, 'mass': addedCount, 'layers': existingLayers})
         if needGif:
-            if randomWalkersCount in intervalSavePic:
-                """
-                print("Saved picture")
-                """
-                usedInterval.append(randomWalkersCount) #append to the used count
-                label=str(randomWalkersCount)
-                plt.matshow(matrix, interpolation='nearest',cmap=cmap)#plt.cm.Blues) #ocean, Paired
-                plt.axis('off')
-                plt.savefig("images/cluster{}.png".format(label), dpi=200)
-                plt.close()
+            if savePic:
+                start = time.perf_counter()
+                if renderer == 'matplotlib':
+                    animation.append(figureFrame(matrix))
+                else:
+                    animation.append(indexedFrame(matrix, imageUpscale, imageDownsample))
+                stats.lap('snapshot', start)
+
+        # Record the lattice if a layer was added (or a snapshot taken)
+        if frames is not None and (savePic if historyAt == 'snapshot' else existingLayers > recordedLayers):
+            start = time.perf_counter()
+            frames.record(matrix, alignMatrix, randomWalkersCount, addedCount, existingLayers)
+            recordedLayers = existingLayers
+            stats.lap('history', start)
        
         # Prevent infinite simulation loop
-        if randomWalkersCount == 20000000:
-            print("CAUTION: had to break the cycle, taking too many iterations")
+        walkerLimit = randomWalkersCount >= 20000000
+        if walkerLimit:
             completeCluster = True
 
         # Stop when cluster reaches edge of square
         if completeCluster == True:
-            print("Walkers added to cluster: ", addedCount)
-            print("Cluster reached edge of square")
+            reportStop(progress, pipeline, 'walkerLimit' if walkerLimit else 'clusterAtEdge', randomWalkersCount, addedCount, existingLayers)
 
         # Stop when surface reaches top of square or cluster is enclosed by layers
         if (surfaceAtEdge == True) or (clusterNotEnclosed == False):
-            print("Walkers added to cluster: ", addedCount)
-            print("Finished, surface reached edge or encloses the cluster entirely ")
+            reportStop(progress, pipeline, 'surfaceAtEdge', randomWalkersCount, addedCount, existingLayers)
             completeSurface = True
 
-    # Constant radius
-    clusterRadius = (squareSize/2 - 5)
-
-    # Not constant radius
-    """
-    
-    clusterRadii = []
-    for i in range(0, squareSize - 1):
-        for j in range (0, squareSize - 1):
-            # Update until found furthest distance from seed particle
-            if matrix[i][j] == 1:
-                clusterRadii.append((i**2 + (j - squareSize/2)**2)**(1/2))
-    
-    clusterRadius = max(clusterRadii)
-    """
+    # Distance from seed origin to furthest particle, over all seeds
+    clusterRadius = max(seedRadii)
 
     # Calculate cluster area (max(x)-min(x))*(max(y)-min(y))
-    minxList = []
-    for i in range(squareSize):
-        for j in range(squareSize):
-            if matrix[i][j] == 1:
-                minxList.append(j)
-                break
-    minx = min(minxList)
-
-    minyList = []
-    for i in range(squareSize):
-        for j in range(squareSize):
-            if matrix[j][i] == 1:
-                minyList.append(j)
-                break
-    miny = min(minyList)
-
-    maxxList = []
-    for i in range(squareSize):
-        for j in range(squareSize - 1, -1, -1):
-            if matrix[i][j] == 1:
-                maxxList.append(j)
-                break
-    maxx = max(maxxList)
-
-    maxyList = []
-    for i in range(squareSize):
-        for j in range(squareSize - 1, -1, -1):
-            if matrix[j][i] == 1:
-                maxyList.append(j)
-                break
-    maxy = max(maxyList)
-
-    clusterArea = (maxx-minx)*(maxy-miny)
+    clusterArea = clusterGeometry.clusterArea(geometry)
     
         
-    # Generate final image of cluster and GIF of simulation
-    plt.matshow(matrix, interpolation='nearest',cmap=cmap)
-    plt.axis('off')
-    plt.savefig("images/cluster.png", dpi=200)
-    plt.close()
-
+    # Generate final image of cluster and last frame of the GIF of simulation,
+    # written by the writer thread of the GIF (or a writer of its own)
+    start = time.perf_counter()
+    writer = animation if needGif else FrameWriter()
+    if renderer == 'matplotlib':
+        frame = figureFrame(matrix)
+    else:
+        frame = indexedFrame(matrix, imageUpscale, imageDownsample)
+    writer.save("images/cluster.png", frame)
     if needGif:
-        with imageio.get_writer('images/movie.gif', mode='I') as writer:
-            for i in usedInterval:
-                filename = "images/cluster" + str(i) + ".png"
-                image = imageio.imread(filename)
-                writer.append_data(image)
-                os.remove(filename)
-            image = imageio.imread("images/cluster.png")
-            writer.append_data(image)
-
-    # Return walkers in cluster / cluster radius / final simulation matrix
-    return (addedCount, clusterRadius, clusterArea, matrix, islands)
-
+        animation.append(frame, final=True)
+    # Final lattice is the last frame of the history
+    if frames is not None:
+        frames.record(matrix, alignMatrix, randomWalkersCount, addedCount, existingLayers)
+        frames.close()
+    if events is not None:
+        events.close()
+    writer.close()
+    stats.lap('output', start)
+
+    # Join the analyses of the layers, islands counted after the last layer
+    layers = pipeline.records()
+    islands = int(layers['islands'][-1])
+    stats.elapsed += time.perf_counter() - runStart
+
+    # Walkers in cluster / cluster radius / final simulation matrix / geometry after every deposition and layer / statistics
+    results = (addedCount, clusterRadius, clusterArea, matrix, islands, historyArrays(history), layers, stats)
+    if hooks is not None and hooks.active:
+        hooks.call('finished', state, results)
+
+    return results
+
+# Pass the reason the run stopped to the progress callback, if any, after
+# the layers analysed so far
+def reportStop(progress, pipeline, reason, randomWalkersCount, addedCount, existingLayers):
+    pipeline.dispatch(wait=True)
+    if progress is not None:
+        progress({'event': 'stopped', 'reason': reason, 'walkers': randomWalkersCount, 'mass': addedCount, 'layers': existingLayers})
+
+# Add a layer to the simulation, merge it into the matrix and check whether
+# the surface has reached the top of the square or enclosed the cluster
+# (the column tops, the front of layer growth, the distance field of jumping
+# walkers, if any, are updated in place, and the layer is submitted to the
+# pipeline of layer analyses, if any)
+def simulationLayer(KPZMatrix, matrix, blockNumber, squareSize, existingLayers, tempProb, depMod, clusterMod, rng, tops, field=None, front=None, pipeline=None):
+
+    KPZMatrix, existingLayers, band = addLayer(KPZMatrix, matrix, blockNumber, squareSize, existingLayers, tempProb, depMod, clusterMod, rng, front)
+    # Merge the modified band into rows 1 to squareSize - 3, columns 1 to squareSize - 2 (metal oxide stays)
+    rowMin, rowMax, colMin, colMax = band
+    rowMin, rowMax = max(rowMin, 1), min(rowMax, squareSize - 2)
+    colMin, colMax = max(colMin, 1), min(colMax, squareSize - 1)
+    if rowMin < rowMax and colMin < colMax:
+        region = matrix[rowMin:rowMax, colMin:colMax]
+        numpy.copyto(region, KPZMatrix[rowMin:rowMax, colMin:colMax], where=(region != 1))
+        # Update the column tops and lower the distance field around the band
+        columnTops.layerTops(tops, matrix, rowMin, rowMax)
+        if field is not None:
+            updateField(field, matrix, squareSize, rowMin, rowMax)
+    # Analyse the layer (islands for measure of anastomosis) on a snapshot
+    if pipeline is not None:
+        pipeline.submit(matrix, tops)
+
+    # Check if surface near top of square (solid silica or solution in top rows)
+    surfaceAtEdge = columnTops.surfaceAtEdge(tops, squareSize)
+
+    # If cluster not enclosed by layer - continue
+    clusterNotEnclosed = columnTops.clusterNotEnclosed(tops, matrix, squareSize)
+
+    return (KPZMatrix, existingLayers, surfaceAtEdge, clusterNotEnclosed)
@@ -17,11 +17,26 @@ diffProb: Probability of diffusion during ballistic deposition (float)
 tempProb: Probability of surface normal deposition in layering (float)
 depMod: Modulating factor in surface-normal deposition (float)
 clusterMod: Modulating factor in on-cluster deposition (float)
+rng: random number generator of the run (Generator)
+front: sites which can grow in surface normal deposition and rows of the
+       last layer, updated in place, or None to find them (dict, see
+       layerFront.py)
 
 OUTPUTS:
 
 KPZMatrix: matrix used in creation of layers (matrix)
 existingLayers: Number of layers in simulation (int)
+band: rows rowMin to rowMax - 1 and columns colMin to colMax - 1 of KPZMatrix
+      touched by the layer, as (rowMin, rowMax, colMin, colMax) (tuple)
+
+Every pass of the layer (gel removal, solidification, deposition, gap fill and
+gel band) gives the band of sites it wrote, and the band of the layer is the
+smallest band holding them all, so the layer is not compared with a copy of
+the matrix. The passes only look at the rows near the last layer: all the
+solution is in the band of the last layer, and the tops of the columns are
+looked for from there up to the highest filled row, going further down only
+for the columns without any, so the cost of a layer does not grow with the
+height of the square.
 """
 
 ### Silica Solution == 4
@@ -31,421 +46,170 @@ existingLayers: Number of layers in simulation (int)
 ### Silica gel == 0
 
 import math
-import matplotlib.pyplot as plt
-from matplotlib import colors
-import random
 import numpy as np
+from rngStreams import defaultGenerator
+from layerFront import newFront, updateFront, frontDeposition, siteBand
 
 # Add solid silica layer to simulation (ballistic deposition or surface normal deposition) 
-def addLayer(KPZMatrix, matrix, blockNumber, squareSize, existingLayers, tempProb, depMod, clusterMod):
+def addLayer(KPZMatrix, matrix, blockNumber, squareSize, existingLayers, tempProb, depMod, clusterMod, rng=None, front=None):
+
+    if rng is None:
+        rng = defaultGenerator()
+    if front is None:
+        # Sites which can grow in surface normal deposition
+        front = newFront(KPZMatrix, matrix, squareSize)
+    # Rows of the last layer, holding all of its solution
+    solutionMin, solutionMax = front['solution']
+    bandRows = np.arange(solutionMax - solutionMin)[:, None]
+    # Bands of sites written by the passes of the layer
+    bands = []
 
-    
     # If layers exist, remove additional area added for clustering
     if existingLayers > 0:
-        # Remove additional area for clustering
-        for i in range(squareSize):
-            for j in range(squareSize - 1, -1, -1):
-                # Highest up site of gel in column
-                if KPZMatrix[j][i] == 4:
-                    marker = j
-                    # Remove 10 blocks of silica gel 
-                    for k in range(marker, marker - 10, -1):
-                        if KPZMatrix[k][i] == 4:
-                            # Site is silica solution
-                            KPZMatrix[k][i] = 0
-                    break
-    
-    
-    
+        # Highest up site of gel in column, remove 10 blocks of silica gel down from it
+        solution = KPZMatrix[solutionMin:solutionMax] == 4
+        top = topmostRows(solution)
+        removed = solution & (bandRows <= top) & (bandRows > top - 10)
+        KPZMatrix[solutionMin:solutionMax][removed] = 0
+        bands.append(modifiedBand(removed, solutionMin))
+        # Sites next to removed gel can grow (gel may be filled in again later in the layer)
+        updateFront(front, KPZMatrix, matrix, squareSize, bands[-1][0], bands[-1][1])
+
     # Solution from previous layer solidifies (silica gel becomes solid silica)
-    for i in range(squareSize):
-        for j in range(squareSize):
-            # Alternate layer values for layer pattern in visualisation
-            if KPZMatrix[i][j] == 4 and existingLayers%2 != 0:
-                KPZMatrix[i][j] = 2
-            elif KPZMatrix[i][j] == 4 and existingLayers%2 == 0:
-                KPZMatrix[i][j] = 3
+    # Alternate layer values for layer pattern in visualisation
+    solution = KPZMatrix[solutionMin:solutionMax] == 4
+    KPZMatrix[solutionMin:solutionMax][solution] = 2 if existingLayers%2 != 0 else 3
+    bands.append(modifiedBand(solution, solutionMin))
 
 
     # First layer must be ballistic deposition
     if existingLayers == 0:
-        for i in range(blockNumber):
-            # Ballistic deposition process            
-            finished = False
-            # Particle starts in random position at top of matrix
-            location = [random.randint(0, squareSize - 1), squareSize - 1]
-            KPZMatrix[location[1]][location[0]] = 4                
-            # While not finished - particle continues to fall
-            # Particle at LHS of simulation area
-            if location[0] == 0:
-                while not finished:
-                    # Look for neighbours
-                    neighbourUp = KPZMatrix[(location[1] - 1)%squareSize][location[0]] 
-                    neighbourRight = KPZMatrix[location[1]][(location[0] + 1)]
-                    if ((location[1]) == 0) or (neighbourUp or neighbourRight) != (0):
-                        finished = True
-                    # If no neighbours - continue falling
-                    else:
-                        KPZMatrix[location[1] - 1][location[0]] = 4
-                        KPZMatrix[location[1]][location[0]] = 0
-                        location[1] -= 1
-            # Particle in RHS of simulation area
-            elif location[0] == squareSize - 1:
-                while not finished:
-                    # Look for neighbours
-                    neighbourUp = KPZMatrix[(location[1] - 1)%squareSize][location[0]] 
-                    neighbourLeft = KPZMatrix[location[1]][(location[0] - 1)]
-                    if ((location[1]) == 0) or (neighbourUp or neighbourLeft) != (0):
-                        finished = True
-                    # If no neighbours - continue falling
-                    else:
-                        KPZMatrix[location[1] - 1][location[0]] = 4
-                        KPZMatrix[location[1]][location[0]] = 0
-                        location[1] -= 1
-            # Particle not at RHS or LHS of simulation area
-            else:
-                while not finished:
-                    # Look for neighbours
-                    neighbourUp = KPZMatrix[(location[1] - 1)%squareSize][location[0]] 
-                    neighbourRight = KPZMatrix[location[1]][(location[0] + 1)]
-                    neighbourLeft = KPZMatrix[location[1]][(location[0] - 1)]
-                    if ((location[1]) == 0) or (neighbourUp or neighbourRight or neighbourLeft) != (0):
-                        finished = True
-                    # If no neighbours - continue falling
-                    else:
-                        KPZMatrix[location[1] - 1][location[0]] = 4
-                        KPZMatrix[location[1]][location[0]] = 0
-                        location[1] -= 1
+        bands.append(ballisticDeposition(KPZMatrix, blockNumber, squareSize, rng, front))
 
 
     elif existingLayers > 0:
         # Decide between ballistic deposition and surface normal deposition
-        marker = random.uniform(0, 1)
+        marker = rng.random()
         # Ballistic deposition
         if tempProb < marker:
-            for i in range(blockNumber):
-                # Ballistic deposition process            
-                finished = False
-                # Particle starts in random position at top of matrix
-                location = [random.randint(0, squareSize - 1), squareSize - 1]
-                KPZMatrix[location[1]][location[0]] = 4                
-                # While not finished - particle continues to fall
-                # Particle at LHS of simulation area
-                if location[0] == 0:
-                    while not finished:
-                        # Look for neighbours
-                        neighbourUp = KPZMatrix[(location[1] - 1)%squareSize][location[0]] 
-                        neighbourRight = KPZMatrix[location[1]][(location[0] + 1)]
-                        if ((location[1]) == 0) or (neighbourUp or neighbourRight) != (0):
-                            finished = True
-                        # If no neighbours - continue falling
-                        else:
-                            KPZMatrix[location[1] - 1][location[0]] = 4
-                            KPZMatrix[location[1]][location[0]] = 0
-                            location[1] -= 1
-                # Particle in RHS of simulation area
-                elif location[0] == squareSize - 1:
-                    while not finished:
-                        # Look for neighbours
-                        neighbourUp = KPZMatrix[(location[1] - 1)%squareSize][location[0]] 
-                        neighbourLeft = KPZMatrix[location[1]][(location[0] - 1)]
-                        if ((location[1]) == 0) or (neighbourUp or neighbourLeft) != (0):
-                            finished = True
-                        # If no neighbours - continue falling
-                        else:
-                            KPZMatrix[location[1] - 1][location[0]] = 4
-                            KPZMatrix[location[1]][location[0]] = 0
-                            location[1] -= 1
-                # Particle not at RHS or LHS of simulation area
-                else:
-                    while not finished:
-                        # Look for neighbours
-                        neighbourUp = KPZMatrix[(location[1] - 1)%squareSize][location[0]] 
-                        neighbourRight = KPZMatrix[location[1]][(location[0] + 1)]
-                        neighbourLeft = KPZMatrix[location[1]][(location[0] - 1)]
-                        if ((location[1]) == 0) or (neighbourUp or neighbourRight or neighbourLeft) != (0):
-                            finished = True
-                        # If no neighbours - continue falling
-                        else:
-                            KPZMatrix[location[1] - 1][location[0]] = 4
-                            KPZMatrix[location[1]][location[0]] = 0
-                            location[1] -= 1
+            bands.append(ballisticDeposition(KPZMatrix, blockNumber, squareSize, rng, front))
 
         # Surface Normal Deposition (with PBCs)
         elif tempProb >= marker:
-            # List for parallel update of layer deposition
-            addList = []
-            # List for parallel update of cluster deposition
-            clusterList = []
-            for i in range(1, squareSize - 1):
-                for j in range(0, squareSize):
-                    if existingLayers%2 == 0:
-                        if (KPZMatrix[i][j] == 3):
-                            # Stochastic cellular automaton
-                            if KPZMatrix[(i + 1)%squareSize][j] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.9717/depMod:
-                                    addList.append([(i + 1)%squareSize,j])
-
-                            if KPZMatrix[(i - 1)%squareSize][j] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.9717/depMod: 
-                                    addList.append([(i - 1)%squareSize,j]) 
-
-                            if KPZMatrix[i][(j + 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.9717/depMod:
-                                    addList.append([i,(j + 1)%squareSize])
-
-                            if KPZMatrix[i][(j  - 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.9717/depMod:
-                                    addList.append([i,(j - 1)%squareSize])
-
-                            if KPZMatrix[(i + 1)%squareSize][(j + 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.54544/depMod:
-                                    addList.append([(i + 1)%squareSize,(j + 1)%squareSize])
-
-                            if KPZMatrix[(i - 1)%squareSize][(j + 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.54544/depMod:
-                                    addList.append([(i - 1)%squareSize,(j + 1)%squareSize])
-
-                            if KPZMatrix[(i + 1)%squareSize][(j - 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.54544/depMod:
-                                    addList.append([(i + 1)%squareSize,(j - 1)%squareSize])
-
-                            if KPZMatrix[(i - 1)%squareSize][(j - 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.54544/depMod:
-                                    addList.append([(i - 1)%squareSize,(j - 1)%squareSize])
-
-                        
-                        
-                        elif (matrix[i][j] == 1) and (3 in nearestNeighbours(i, j, KPZMatrix, squareSize) or 6 in nearestNeighbours(i, j, KPZMatrix, squareSize)):
-                            if KPZMatrix[(i + 1)%squareSize][j] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.9717/clusterMod:
-                                    clusterList.append([(i + 1)%squareSize,j])
-
-                            if KPZMatrix[(i - 1)%squareSize][j] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.9717/clusterMod: 
-                                    clusterList.append([(i - 1)%squareSize,j])
-
-                            if KPZMatrix[i][(j + 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.9717/clusterMod:
-                                    clusterList.append([i,(j + 1)%squareSize])
-
-                            if KPZMatrix[i][(j  - 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.9717/clusterMod:
-                                    clusterList.append([i,(j - 1)%squareSize])
-
-                            if KPZMatrix[(i + 1)%squareSize][(j + 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.54544/clusterMod:
-                                    clusterList.append([(i + 1)%squareSize,(j + 1)%squareSize])
-
-                            if KPZMatrix[(i - 1)%squareSize][(j + 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.54544/clusterMod:
-                                    clusterList.append([(i - 1)%squareSize,(j + 1)%squareSize])
-
-                            if KPZMatrix[(i + 1)%squareSize][(j - 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.54544/clusterMod:
-                                    clusterList.append([(i + 1)%squareSize,(j - 1)%squareSize])
-
-                            if KPZMatrix[(i - 1)%squareSize][(j - 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.54544/clusterMod:
-                                    clusterList.append([(i - 1)%squareSize,(j - 1)%squareSize])
-                    
-                        
-                                    
-                    elif existingLayers%2 != 0:
-                        if (KPZMatrix[i][j] == 2):
-                            # Stochastic cellular automaton
-                            if KPZMatrix[(i + 1)%squareSize][j] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.9717/depMod:
-                                    addList.append([(i + 1)%squareSize,j])
-
-                            if KPZMatrix[(i - 1)%squareSize][j] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.9717/depMod: 
-                                    addList.append([(i - 1)%squareSize,j])
-
-                            if KPZMatrix[i][(j + 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.9717/depMod:
-                                    addList.append([i,(j + 1)%squareSize])
-
-                            if KPZMatrix[i][(j  - 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.9717/depMod: 
-                                    addList.append([i,(j - 1)%squareSize])
-
-                            if KPZMatrix[(i + 1)%squareSize][(j + 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.54544/depMod:
-                                    addList.append([(i + 1)%squareSize,(j + 1)%squareSize])
-
-                            if KPZMatrix[(i - 1)%squareSize][(j + 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.54544/depMod:
-                                    addList.append([(i - 1)%squareSize,(j + 1)%squareSize])
-
-                            if KPZMatrix[(i + 1)%squareSize][(j - 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.54544/depMod:
-                                    addList.append([(i + 1)%squareSize,(j - 1)%squareSize])
-
-                            if KPZMatrix[(i - 1)%squareSize][(j - 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.54544/depMod:
-                                    addList.append([(i - 1)%squareSize,(j - 1)%squareSize])
-
-                        
-                    
-                        
-                        elif (matrix[i][j] == 1) and (2 in nearestNeighbours(i, j, KPZMatrix, squareSize) or 6 in nearestNeighbours(i, j, KPZMatrix, squareSize)):
-                            if KPZMatrix[(i + 1)%squareSize][j] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.9717/clusterMod:
-                                    clusterList.append([(i + 1)%squareSize,j])
-
-                            if KPZMatrix[(i - 1)%squareSize][j] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.9717/clusterMod: 
-                                    clusterList.append([(i - 1)%squareSize,j])
-
-                            if KPZMatrix[i][(j + 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.9717/clusterMod:
-                                    clusterList.append([i,(j + 1)%squareSize])
-
-                            if KPZMatrix[i][(j  - 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.9717/clusterMod:
-                                    clusterList.append([i,(j - 1)%squareSize])
-
-                            if KPZMatrix[(i + 1)%squareSize][(j + 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.54544/clusterMod:
-                                    clusterList.append([(i + 1)%squareSize,(j + 1)%squareSize])
-
-                            if KPZMatrix[(i - 1)%squareSize][(j + 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.54544/clusterMod:
-                                    clusterList.append([(i - 1)%squareSize,(j + 1)%squareSize])
-
-                            if KPZMatrix[(i + 1)%squareSize][(j - 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.54544/clusterMod:
-                                    clusterList.append([(i + 1)%squareSize,(j - 1)%squareSize])
-
-                            if KPZMatrix[(i - 1)%squareSize][(j - 1)%squareSize] == 0:
-                                marker = random.uniform(0, 1)
-                                if marker < 0.54544/clusterMod:
-                                    clusterList.append([(i - 1)%squareSize,(j - 1)%squareSize])
-
-            # Parallel update
-            for i in addList:
-                KPZMatrix[i[0]][i[1]] = 4
-            for i in clusterList:
-                KPZMatrix[i[0]][i[1]] = 6
-                                                      
-                                
+            bands.append(frontDeposition(KPZMatrix, matrix, squareSize, existingLayers, depMod, clusterMod, rng, front))
+
+
     # Add to layer variable     
     existingLayers += 1
-
-    
-    # Fill in gaps in KPZ layer   
-    for i in range(squareSize):
-        for j in range(squareSize - 1, -1, -1):
-            if KPZMatrix[j][i] == 4:
-                markerMax = j
-                break
-        for j in range(squareSize - 1, -1, -1):
-            if KPZMatrix[j][i] == 2 or KPZMatrix[j][i] == 3:
-                markerMin = j
-                break
-
-        if existingLayers > 1:
-            try:
-                for k in range(markerMax, markerMin, -1):
-                    if KPZMatrix[k][i] == 0:
-                        KPZMatrix[k][i] = 4
-            except NameError:
-                pass
-        else:
-            try:
-                for k in range(markerMax, 0, -1):
-                    if KPZMatrix[k][i] == 0:
-                        KPZMatrix[k][i] = 4
-            except NameError:
-                pass
-
-    
-
-    
-    # Additional area for clustering
-    for i in range(squareSize):
-        for j in range(squareSize - 1, -1, -1):
-            # Reached layers
-            if KPZMatrix[j][i] == 2 or KPZMatrix[j][i] == 3 or KPZMatrix[j][i] == 4:
-                marker = j
-                # Fill 10 blocks above layer surface with silica gel
-                if marker < squareSize - 15:
-                    try:
-                        for k in range(marker + 1, marker+11):
-                            if KPZMatrix[k][i] == 0:
-                                KPZMatrix[k][i] = 4
-                    except NameError:
-                        for k in range(0, 10):
-                            if KPZMatrix[k][i] == 0:
-                                KPZMatrix[k][i] = 4
-                    break
-                else:
-                    pass
-
-    
-
-
-    return (KPZMatrix, existingLayers)
-
-# Obtain nearest neighbours (Moore neighbourhood)
-def nearestNeighbours(i, j, KPZMatrix, squareSize):
-    nearestNeighbours = []
-
-    nearestNeighbours.append(KPZMatrix[(i + 1)%squareSize][j])
-    
-
-    nearestNeighbours.append(KPZMatrix[(i - 1)%squareSize][j]) 
-
-                            
-    nearestNeighbours.append(KPZMatrix[i][(j + 1)%squareSize]) 
-
-                            
-    nearestNeighbours.append(KPZMatrix[i][(j - 1)%squareSize]) 
-
-                          
-    nearestNeighbours.append(KPZMatrix[(i + 1)%squareSize][(j + 1)%squareSize]) 
-
-
-    nearestNeighbours.append(KPZMatrix[(i - 1)%squareSize][(j + 1)%squareSize])
-
-                            
-    nearestNeighbours.append(KPZMatrix[(i + 1)%squareSize][(j - 1)%squareSize])
-
-                          
-    nearestNeighbours.append(KPZMatrix[(i - 1)%squareSize][(j - 1)%squareSize])
-
-    return(nearestNeighbours)
-
-    
+    # Rows of the deposited solution, no site above top is filled
+    depositMin, depositMax = bands[-1][:2]
+    top = max(front['top'], depositMax)
+
+
+    # Fill in gaps in KPZ layer, from the highest solution site of each column
+    # down to the highest solid silica site (or down to row 1 for the first layer)
+    markerMax = topmostRows(KPZMatrix[depositMin:depositMax] == 4, depositMin)
+    if existingLayers > 1:
+        markerMin = np.maximum(topmostBelow(KPZMatrix, (2, 3), solutionMin, top), 0)
+    else:
+        markerMin = np.zeros(squareSize, dtype=int)
+    filling = markerMax >= 0
+    if filling.any():
+        rowMin = markerMin[filling].min() + 1
+        rows = np.arange(rowMin, markerMax.max() + 1)[:, None]
+        gaps = (KPZMatrix[rowMin:markerMax.max() + 1] == 0) & (rows <= markerMax) & (rows > markerMin)
+        KPZMatrix[rowMin:markerMax.max() + 1][gaps] = 4
+        bands.append(modifiedBand(gaps, rowMin))
+
+
+    # Additional area for clustering - fill 10 blocks above the highest layer
+    # site of each column (below the top 15 rows) with silica gel
+    marker = topmostBelow(KPZMatrix, (2, 3, 4), solutionMin, min(top, squareSize - 15))
+    if (marker >= 0).any():
+        rowMin = marker[marker >= 0].min() + 1
+        rowMax = min(marker.max() + 11, squareSize)
+        rows = np.arange(rowMin, rowMax)[:, None]
+        area = (KPZMatrix[rowMin:rowMax] == 0) & (rows > marker) & (rows <= marker + 10) & (marker >= 0)
+        KPZMatrix[rowMin:rowMax][area] = 4
+        bands.append(modifiedBand(area, rowMin))
+
+    # Band of rows and columns touched by the layer
+    band = mergeBands(bands)
+    # Sites next to any site changed by the layer
+    updateFront(front, KPZMatrix, matrix, squareSize, band[0], band[1])
+    # All solution of the layer is in its band
+    front['solution'] = band[:2]
+    front['top'] = max(top, band[1])
+
+    return (KPZMatrix, existingLayers, band)
+
+# Highest row of mask in each column (-1 if none), mask starting at row rowMin
+def topmostRows(mask, rowMin=0):
+
+    if len(mask) == 0:
+        return np.full(mask.shape[1], -1)
+
+    return np.where(mask.any(axis=0), rowMin + len(mask) - 1 - np.argmax(mask[::-1], axis=0), -1)
+
+# Highest row below rowMax of each column holding one of codes (-1 if none),
+# looked for from rowMin up, then in deeper and deeper bands below for the
+# columns without any
+def topmostBelow(KPZMatrix, codes, rowMin, rowMax):
+
+    columns = np.arange(KPZMatrix.shape[1])
+    top = np.full(len(columns), -1)
+    rowMin = min(rowMin, rowMax)
+    while len(columns) > 0 and rowMax > 0:
+        found = topmostRows(np.isin(KPZMatrix[rowMin:rowMax, columns], codes), rowMin)
+        top[columns[found >= 0]] = found[found >= 0]
+        columns = columns[found < 0]
+        rowMin, rowMax = max(rowMin - 2*(rowMax - rowMin) - 1, 0), rowMin
+
+    return top
+
+# Smallest band of rows and columns holding every modified site, mask starting at row rowMin
+def modifiedBand(modified, rowMin=0):
+
+    rows = np.flatnonzero(modified.any(axis=1))
+    cols = np.flatnonzero(modified.any(axis=0))
+    if len(rows) == 0:
+        return (0, 0, 0, 0)
+
+    return (rowMin + rows[0], rowMin + rows[-1] + 1, cols[0], cols[-1] + 1)
+
+# Smallest band holding every band of a list (empty bands left out)
+def mergeBands(bands):
+
+    bands = [band for band in bands if band[0] < band[1]]
+    if len(bands) == 0:
+        return (0, 0, 0, 0)
+
+    return (min(band[0] for band in bands), max(band[1] for band in bands),
+            min(band[2] for band in bands), max(band[3] for band in bands))
+
+# Ballistic deposition of blockNumber blocks of silica solution onto KPZMatrix,
+# returning the band of the blocks
+def ballisticDeposition(KPZMatrix, blockNumber, squareSize, rng, front):
+
+    # Columns where blocks are released
+    columns = rng.integers(0, squareSize, blockNumber).tolist()
+    # Height of the highest occupied site in each column (-1 if empty)
+    heights = topmostBelow(KPZMatrix, (2, 3, 4, 6), front['solution'][0], front['top']).tolist()
+    rows = []
+    for column in columns:
+        # Block falls from the top of the matrix until it lands on its column
+        # or touches the side of a neighbouring column
+        row = heights[column] + 1
+        if column > 0:
+            row = max(row, heights[column - 1])
+        if column < squareSize - 1:
+            row = max(row, heights[column + 1])
+        # Blocks stop at the top of the matrix (or the bottom row)
+        row = min(max(row, 0), squareSize - 1)
+        heights[column] = max(heights[column], row)
+        rows.append(row)
+
+    # Write the layer in one pass
+    KPZMatrix[rows, columns] = 4
+
+    return siteBand(np.array(rows, dtype=int)*squareSize + columns, squareSize)
@@ -0,0 +1,358 @@
+"""
+benchmark.py - reproducible performance benchmarks of the simulation, so that
+the speed of two commits can be compared on the same machine.
+
+Every kernel is timed on its own, on inputs built from a fixed seed (so the
+same work is timed at every commit, as long as the kernel draws the same
+random numbers):
+
+walkerSerial: unit steps of single walkers with walkWalker (stepKernel.py)
+checkAround: unit steps of single walkers with checkAround (checkAround.py)
+walkerBatch: walker steps of the batched engine (walkerEngine.py)
+bdLayer: ballistic deposition layers (addLayer.py)
+sndLayer: surface normal deposition layers (addLayer.py, layerFront.py)
+islandCount: islands of the whole square (countIslands.py)
+islandTracker: islands after a deposition, counted incrementally (countIslands.py)
+endToEnd: whole runs of DLAcluster (batched engine, launched on the shell
+          with jumps ahead, in a temporary directory), with the time of every
+          phase of the run (see runStats.py)
+endToEndSerial: whole runs of DLAcluster in its default configuration (serial
+                engine, launched at the edge), once on a small square
+                (serialCase) as these runs are slow
+
+Kernels are run over a grid of squareSize, blockNumber and layerStep values
+(blockNumber given in blocks per column of the square, so that layers are
+equally thick at every squareSize). Every case is timed repeats times, on
+fresh inputs each time, and its peak memory is taken with tracemalloc in one
+more run (not timed, tracing slows the kernels down). Results are written as
+JSON with the commit, the machine and the versions of Python and NumPy.
+
+python benchmark.py [--quick] [--repeats n] [--output path]
+python benchmark.py --compare before after
+
+INPUTS: runBenchmarks(grid, repeats, memory)
+        writeResults(path, results)
+        compareResults(before, after)
+
+grid: squareSize, blocksPerColumn and layerStep values (dict of lists)
+repeats: number of timed runs of every case (int)
+memory: take the peak memory of every case (bool)
+path: path of the JSON file of results (str)
+before, after: paths of two JSON files of results (str)
+
+OUTPUTS:
+
+results: commit, machine and a record of every case - kernel, parameters,
+         times of the runs, best and median time, work done, rate (work per
+         second of the best time) and peak memory in bytes (dict)
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import numpy
+from addLayer import addLayer
+from checkAround import checkAround
+from countIslands import countIslands, IslandTracker
+from DLAcluster import DLAcluster
+from latticeState import newLattice
+from layerFront import newFront
+from randomAtSurface import randomAtSurface
+from rngStreams import makeGenerator, RandomBlock
+from stepKernel import walkWalker, DirectionBuffer, edgeMask
+from walkerEngine import advanceWalkers
+
+# Seed of the inputs of every case
+benchmarkSeed = 20240601
+# Grid of the full suite and of a quick check
+fullGrid = {'squareSize': [100, 200, 400, 1000], 'blocksPerColumn': [5, 10], 'layerStep': [50, 200]}
+quickGrid = {'squareSize': [100, 200], 'blocksPerColumn': [5], 'layerStep': [50]}
+# Square of the serial end-to-end run (the default configuration of DLAcluster)
+serialCase = {'squareSize': 100, 'blockNumber': 500, 'layerStep': 50}
+# Work done by every run of a kernel
+walkerSteps = 200000
+batchCalls = 100
+batchSize = 4096
+layerCount = 5
+islandDeposits = 20
+# Fraction of the layered square turned into metal oxide for the island counts
+oxideFraction = 0.3
+
+# Square at the start of a run - solid bottom row, one seed in the middle
+def initialLattice(squareSize):
+
+    matrix = newLattice(squareSize)
+    matrix[0, :] = 3
+    matrix[1, squareSize//2] = 1
+
+    return matrix
+
+# Square after layerCount ballistic deposition layers, oxide scattered in the silica
+def layeredLattice(squareSize, blockNumber, rng):
+
+    matrix = initialLattice(squareSize)
+    KPZMatrix = newLattice(squareSize)
+    existingLayers = 0
+    for i in range(layerCount):
+        KPZMatrix, existingLayers, band = addLayer(KPZMatrix, matrix, blockNumber, squareSize, existingLayers, 0.0, 1, 1, rng)
+    numpy.copyto(matrix[1:], KPZMatrix[1:], where=(matrix[1:] != 1))
+    oxide = (rng.random(matrix.shape) < oxideFraction) & numpy.isin(matrix, (2, 3))
+    matrix[oxide] = 1
+
+    return matrix
+
+# Walk single walkers with the fused stepping kernel
+def walkerSerialCase(squareSize):
+
+    matrix = initialLattice(squareSize)
+    cells = memoryview(matrix.reshape(-1))
+    edge = edgeMask(squareSize)
+    rng = RandomBlock(makeGenerator(benchmarkSeed))
+    directions = DirectionBuffer(rng)
+
+    def run():
+        steps = walkers = 0
+        while steps < walkerSteps:
+            location = randomAtSurface(squareSize, rng=rng)
+            steps += walkWalker(location[1]*squareSize + location[0], cells, edge, squareSize, directions, rng)[3]
+            walkers += 1
+        return {'steps': steps, 'walkers': walkers}
+
+    return run
+
+# Walk single walkers one checkAround call per step
+def checkAroundCase(squareSize):
+
+    matrix = initialLattice(squareSize)
+    rng = RandomBlock(makeGenerator(benchmarkSeed))
+
+    def run():
+        steps = walkers = 0
+        while steps < walkerSteps:
+            location = randomAtSurface(squareSize, rng=rng)
+            walkers += 1
+            foundFriend = nearEdge = False
+            while not foundFriend and not nearEdge and steps < walkerSteps:
+                location, foundFriend, nearEdge, orientation = checkAround(location, squareSize, matrix, rng)
+                steps += 1
+        return {'steps': steps, 'walkers': walkers}
+
+    return run
+
+# Advance a pool of walkers (no deposits, so the square does not change)
+def walkerBatchCase(squareSize):
+
+    matrix = initialLattice(squareSize)
+    alignMatrix = newLattice(squareSize)
+    rng = makeGenerator(benchmarkSeed)
+
+    def run():
+        walkers = None
+        for i in range(batchCalls):
+            walkers = advanceWalkers(walkers, matrix, alignMatrix, squareSize, 0.5, batchSize, 0, rng)[0]
+        return {'steps': batchCalls*batchSize}
+
+    return run
+
+# Add ballistic deposition layers
+def bdLayerCase(squareSize, blockNumber):
+
+    matrix = initialLattice(squareSize)
+    KPZMatrix = newLattice(squareSize)
+    front = newFront(KPZMatrix, matrix, squareSize)
+    rng = makeGenerator(benchmarkSeed)
+
+    def run():
+        existingLayers = 0
+        for i in range(layerCount):
+            layer = addLayer(KPZMatrix, matrix, blockNumber, squareSize, existingLayers, 0.0, 1, 1, rng, front)
+            existingLayers = layer[1]
+        return {'layers': layerCount}
+
+    return run
+
+# Add surface normal deposition layers onto a first ballistic deposition layer
+def sndLayerCase(squareSize, blockNumber):
+
+    matrix = initialLattice(squareSize)
+    KPZMatrix = newLattice(squareSize)
+    front = newFront(KPZMatrix, matrix, squareSize)
+    rng = makeGenerator(benchmarkSeed)
+    # First layer is always ballistic deposition
+    addLayer(KPZMatrix, matrix, blockNumber, squareSize, 0, 1.0, 1, 1, rng, front)
+
+    def run():
+        existingLayers = 1
+        for i in range(layerCount):
+            layer = addLayer(KPZMatrix, matrix, blockNumber, squareSize, existingLayers, 1.0, 1, 1, rng, front)
+            existingLayers = layer[1]
+        return {'layers': layerCount}
+
+    return run
+
+# Count the islands of the whole square
+def islandCountCase(squareSize, blockNumber):
+
+    matrix = layeredLattice(squareSize, blockNumber, makeGenerator(benchmarkSeed))
+
+    def run():
+        return {'sites': squareSize**2, 'islands': countIslands(matrix, squareSize)}
+
+    return run
+
+# Count the islands after every one of islandDeposits depositions on solution
+def islandTrackerCase(squareSize, blockNumber):
+
+    rng = makeGenerator(benchmarkSeed)
+    matrix = layeredLattice(squareSize, blockNumber, rng)
+    tracker = IslandTracker(squareSize)
+    tracker.count(matrix)
+    solution = numpy.flatnonzero(matrix[:squareSize - 5] == 4)
+    sites = rng.choice(solution, min(islandDeposits, len(solution)), replace=False)
+
+    def run():
+        islands = None
+        for site in sites:
+            y, x = divmod(int(site), squareSize)
+            matrix[y, x] = 1
+            tracker.deposit(y)
+            islands = tracker.count(matrix)
+        return {'counts': len(sites), 'islands': islands}
+
+    return run
+
+# Whole run of the simulation
+def endToEndCase(squareSize, blockNumber, layerStep):
+
+    def run():
+        results = DLAcluster(squareSize, False, blockNumber, layerStep, 0.7, 1, 0.5, 1, 1, engine='batch', launch='shell',
+                             jumpAhead=True, seed=benchmarkSeed, progress=None)
+        stats = results[7]
+        return {'mass': results[0], 'layers': len(results[6]['layer']), 'phases': dict(stats.phases)}
+
+    return run
+
+# Whole run of the simulation in the default configuration
+def endToEndSerialCase(squareSize, blockNumber, layerStep):
+
+    def run():
+        results = DLAcluster(squareSize, False, blockNumber, layerStep, 0.7, 1, 0.5, 1, 1, seed=benchmarkSeed, progress=None)
+        stats = results[7]
+        return {'mass': results[0], 'layers': len(results[6]['layer']), 'phases': dict(stats.phases)}
+
+    return run
+
+# Time a case (fresh inputs for every run) and take its peak memory
+def measure(setup, repeats, memory):
+
+    seconds = []
+    for i in range(repeats):
+        run = setup()
+        start = time.perf_counter()
+        work = run()
+        seconds.append(time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        run = setup()
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return (seconds, work, peak)
+
+# Cases of the suite over a grid, as (kernel, parameters, setup, unit of work)
+def benchmarkCases(grid):
+
+    cases = []
+    for squareSize in grid['squareSize']:
+        cases.append(('walkerSerial', {'squareSize': squareSize}, lambda n=squareSize: walkerSerialCase(n), 'steps'))
+        cases.append(('checkAround', {'squareSize': squareSize}, lambda n=squareSize: checkAroundCase(n), 'steps'))
+        cases.append(('walkerBatch', {'squareSize': squareSize}, lambda n=squareSize: walkerBatchCase(n), 'steps'))
+        for blocksPerColumn in grid['blocksPerColumn']:
+            parameters = {'squareSize': squareSize, 'blockNumber': blocksPerColumn*squareSize}
+            for kernel, setup, unit in [('bdLayer', bdLayerCase, 'layers'), ('sndLayer', sndLayerCase, 'layers'),
+                                        ('islandCount', islandCountCase, 'sites'), ('islandTracker', islandTrackerCase, 'counts')]:
+                cases.append((kernel, parameters, lambda setup=setup, p=parameters: setup(**p), unit))
+            for layerStep in grid['layerStep']:
+                parameters = dict(parameters, layerStep=layerStep)
+                cases.append(('endToEnd', parameters, lambda p=parameters: endToEndCase(**p), 'mass'))
+    cases.append(('endToEndSerial', serialCase, lambda: endToEndSerialCase(**serialCase), 'mass'))
+
+    return cases
+
+# Run every case of the suite
+def runBenchmarks(grid=fullGrid, repeats=3, memory=True):
+
+    records = []
+    # Images of the end-to-end runs are written to a temporary directory
+    directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        try:
+            for kernel, parameters, setup, unit in benchmarkCases(grid):
+                seconds, work, peak = measure(setup, repeats, memory)
+                best = min(seconds)
+                records.append({'kernel': kernel, 'parameters': parameters, 'seconds': seconds, 'best': best,
+                                'median': float(numpy.median(seconds)), 'work': work, 'unit': unit,
+                                'rate': work[unit]/best if best > 0 else None, 'peakBytes': peak})
+                print(kernel, parameters, "best %.4f s, %.4g %s/s" % (best, records[-1]['rate'] or 0, unit))
+        finally:
+            os.chdir(directory)
+
+    return {'commit': gitCommit(), 'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'machine': {'platform': platform.platform(), 'processor': platform.processor(), 'cpus': os.cpu_count()},
+            'python': platform.python_version(), 'numpy': numpy.__version__, 'seed': benchmarkSeed,
+            'grid': grid, 'repeats': repeats, 'results': records}
+
+# Commit of the working tree (None outside a git repository)
+def gitCommit():
+
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Write the results of the suite as JSON
+def writeResults(path, results):
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=1)
+
+# Print the ratio of the best times of the cases found in two results files
+def compareResults(before, after):
+
+    with open(before) as file:
+        old = json.load(file)
+    with open(after) as file:
+        new = json.load(file)
+    oldBest = {(record['kernel'], json.dumps(record['parameters'], sort_keys=True)): record for record in old['results']}
+
+    print("before:", old['commit'], "after:", new['commit'])
+    for record in new['results']:
+        key = (record['kernel'], json.dumps(record['parameters'], sort_keys=True))
+        if key in oldBest:
+            ratio = record['best']/oldBest[key]['best']
+            print(record['kernel'], record['parameters'], "%.4f s -> %.4f s (x%.2f)" % (oldBest[key]['best'], record['best'], ratio))
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Benchmarks of the DLA simulation")
+    parser.add_argument('--quick', action='store_true', help="small grid for a quick check")
+    parser.add_argument('--repeats', type=int, default=3, help="timed runs of every case")
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help="skip the peak memory runs")
+    parser.add_argument('--output', default='benchmark.json', help="JSON file of results")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="compare two JSON files of results")
+    options = parser.parse_args()
+
+    if options.compare is not None:
+        compareResults(*options.compare)
+    else:
+        writeResults(options.output, runBenchmarks(quickGrid if options.quick else fullGrid, options.repeats, options.memory))
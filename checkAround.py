@@ -3,11 +3,12 @@ checkAround.py - given a  particle location, if particle lies near edge
 of simulation area. If not, checks for neighbouring particles. If no
 neighbouring particles, particle randomly walks.
 
-INPUTS: checkAround(location, squareSize, matrix)
+INPUTS: checkAround(location, squareSize, matrix, rng)
 
 location: location of a random walker (list)
 squareSize: dimensions of simulation square (int)
 matrix: matrix representation of simulation (matrix)
+rng: random number generator of the run (Generator)
 
 
 OUTPUTS:
@@ -18,9 +19,22 @@ nearEdge: random walker near edge of square (bool)
 orientation: direction of nearest neighbour particle (str)
 """
 
-import random
+from rngStreams import defaultGenerator
 
-def checkAround(location, squareSize, matrix):
+# Orientation codes of a neighbouring cluster particle (Von Neumann), in the
+# order checkAround tests them - a later match overrides an earlier one
+orientationNames = ['down', 'up', 'right', 'left']
+# Offsets (dy, dx) from a walker to its neighbour in each orientation
+neighbourOffsets = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+# Walker alignment counted as aligned with a neighbour in each orientation
+alignedCells = [1, 3, 4, 2]
+# Cell values of solid silica, which walkers cannot enter
+solidCodes = (2, 3, 6)
+
+def checkAround(location, squareSize, matrix, rng=None):
+
+	if rng is None:
+		rng = defaultGenerator()
 
         # Found another particle
 	foundFriend = False 
@@ -62,7 +76,7 @@ def checkAround(location, squareSize, matrix):
 
         # After checking location, if no nearest neighbour (Von Neumann): randomly walk one step
 	if not foundFriend and not nearEdge:
-		decide = random.random()
+		decide = rng.random()
 		if decide < 0.25:
 			location = [location[0] - 1, location[1]]
 		elif decide < 0.5:
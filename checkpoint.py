@@ -0,0 +1,109 @@
+"""
+checkpoint.py - checkpoints of long DLACluster runs, so that a run which
+crashed or was stopped can be continued from its last checkpoint.
+
+A checkpoint holds the whole state of a run between two iterations of the
+walker loop: the arguments of the run, the lattices, the counters, the
+random number generator (with the blocks of numbers already drawn), the
+cluster geometry, the column tops, the front of layer growth, the distance
+field, the pool of walkers, the layer analyses so far and the lengths of the
+GIF and of the lattice history so far. A run resumed from a checkpoint with
+a seeded generator is identical to the run which was never stopped.
+
+Checkpoints are written to one compressed file (pickle, gzip), first to a
+temporary file which then replaces the checkpoint, so the checkpoint on disk
+is always complete. They are due every checkpointSeconds of wall-clock time
+or every checkpointLayers layers, whichever comes first.
+
+INPUTS: CheckpointClock(checkpointSeconds, checkpointLayers, existingLayers)
+        CheckpointClock.due(existingLayers)
+        CheckpointClock.reset(existingLayers)
+        saveCheckpoint(path, state)
+        loadCheckpoint(path)
+        rngState(rng, directions)
+        restoreRng(rng, directions, state)
+        resumeCluster(path, progress, hooks)
+
+checkpointSeconds: wall-clock time between checkpoints, None for no limit (float)
+checkpointLayers: layers between checkpoints, None for no limit (int)
+existingLayers: Number of layers in simulation (int)
+path: path of the checkpoint file (str)
+state: state of the run (dict)
+rng: random number generator of the run (RandomBlock)
+directions: random directions of the stepping kernel (DirectionBuffer)
+progress: progress callback of the resumed run (function, see runStats.py)
+hooks: callbacks on the events of the resumed run (HookRegistry, see
+       simulationHooks.py)
+
+OUTPUTS:
+
+due: a checkpoint is due (bool)
+state: state of the run (dict)
+results: results of the resumed run (see DLACluster.py)
+"""
+
+import gzip
+import os
+import pickle
+import time
+from runStats import printProgress
+
+# Time or number of layers between the checkpoints of a run
+class CheckpointClock:
+
+    def __init__(self, checkpointSeconds=None, checkpointLayers=None, existingLayers=0):
+        self.checkpointSeconds = checkpointSeconds
+        self.checkpointLayers = checkpointLayers
+        self.reset(existingLayers)
+
+    # A checkpoint is due
+    def due(self, existingLayers):
+
+        if self.checkpointSeconds is not None and time.monotonic() - self.start >= self.checkpointSeconds:
+            return True
+
+        return self.checkpointLayers is not None and existingLayers - self.layers >= self.checkpointLayers
+
+    # Checkpoint written
+    def reset(self, existingLayers):
+        self.start = time.monotonic()
+        self.layers = existingLayers
+
+# Write the state of a run to the checkpoint file (replaced in one step)
+def saveCheckpoint(path, state):
+
+    temporary = path + '.tmp'
+    with gzip.open(temporary, 'wb', compresslevel=6) as file:
+        pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+    # Checkpoint is on disk before it replaces the previous one
+    with open(temporary, 'rb') as file:
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+# Read the state of a run from a checkpoint file
+def loadCheckpoint(path):
+    with gzip.open(path, 'rb') as file:
+        return pickle.load(file)
+
+# State of the random number generator and of the random directions
+def rngState(rng, directions):
+    return {'generator': rng.generator.bit_generator.state, 'block': list(rng.block), 'position': rng.position,
+            'directions': directions.data, 'directionPosition': directions.position}
+
+# Put the random number generator and the random directions back in a saved state
+def restoreRng(rng, directions, state):
+
+    rng.generator.bit_generator.state = state['generator']
+    rng.block = list(state['block'])
+    rng.position = state['position']
+    directions.data = state['directions']
+    directions.position = state['directionPosition']
+
+# Continue the run of a checkpoint file, with the arguments it was started with
+def resumeCluster(path, progress=printProgress, hooks=None):
+
+    from DLAcluster import DLAcluster
+
+    state = loadCheckpoint(path)
+
+    return DLAcluster(**state['arguments'], progress=progress, hooks=hooks, resume=state)
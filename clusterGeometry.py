@@ -0,0 +1,142 @@
+"""
+clusterGeometry.py - geometry of the metal oxide cluster, kept up to date as
+particles are deposited instead of scanning the whole matrix.
+
+Every particle belongs to the seed whose cluster it grew from: a deposited
+particle takes the seed of a neighbouring cluster particle (with the same
+precedence as checkAround: left, right, up, down). The radius of each seed's
+cluster is the largest distance from the seed origin (the seed's column on
+the bottom row of the square) to any of its particles.
+
+Running sums over all cluster particles (seeds included) give the bounding
+box and the radius of gyration at any time, and a sample of them is
+recorded after every deposition, so that the growth of one cluster (e.g.
+mass against radius) can be followed without going back over the matrix.
+
+INPUTS: seedLattice(squareSize, seedX, seedY)
+        depositRadius(seedMatrix, seedRadii, seedX, x, y)
+        newGeometry(seedX, seedY)
+        depositGeometry(geometry, x, y)
+        recordGeometry(history, geometry, mass, radius)
+        historyArrays(history)
+
+squareSize: dimensions of simulation square (int)
+seedX, seedY: coordinates of the seed particles (arrays)
+seedMatrix: index of the seed of every cluster particle, the largest value of
+            its type elsewhere (array)
+seedRadii: radius of the cluster grown from each seed (list)
+x, y: position of a deposited particle (int)
+geometry: running sums over the cluster particles (dict)
+history: samples of the cluster geometry, one per deposition (dict)
+mass: number of particles added to the cluster (int)
+radius: current cluster radius (float)
+
+OUTPUTS:
+
+seedMatrix: index of the seed of every cluster particle, the largest value of
+            its type elsewhere (array)
+seedRadii: radius of the cluster grown from each seed (list)
+seed: index of the seed of the deposited particle (int)
+clusterArea: area of the bounding box of the cluster (int)
+gyration: radius of gyration of the cluster (float)
+history: samples of mass, radius, gyration radius and bounding box (dict of arrays)
+
+The seed lattice takes one byte per site (two with 255 seeds or more), so
+sites without a seed hold 255 (32767 with two bytes).
+"""
+
+import numpy
+from checkAround import neighbourOffsets
+
+# Label the seed particles with their index
+def seedLattice(squareSize, seedX, seedY):
+
+    # One byte per site, with a spare value for no seed
+    seedType = numpy.uint8 if len(seedX) < numpy.iinfo(numpy.uint8).max else numpy.int16
+    seedMatrix = numpy.full((squareSize, squareSize), numpy.iinfo(seedType).max, dtype=seedType)
+    for i in range(len(seedX)):
+        seedMatrix[int(seedY[i])][int(seedX[i])] = i
+    # Seeds have not grown yet
+    seedRadii = [0.0]*len(seedX)
+
+    return (seedMatrix, seedRadii)
+
+# Attribute a deposited particle to a seed and update the radius of that seed
+def depositRadius(seedMatrix, seedRadii, seedX, x, y):
+
+    # Seed of the neighbouring particle (last in checkAround order wins)
+    seed = -1
+    for dy, dx in neighbourOffsets:
+        if seedMatrix[y + dy][x + dx] < len(seedRadii):
+            seed = int(seedMatrix[y + dy][x + dx])
+    # Distance from the seed origin
+    if seed >= 0:
+        seedMatrix[y][x] = seed
+        seedRadii[seed] = max(seedRadii[seed], (y**2 + (x - int(seedX[seed]))**2)**(1/2))
+
+    return seed
+
+# Running sums over the seed particles
+def newGeometry(seedX, seedY):
+
+    geometry = {'count': 0, 'minX': None, 'maxX': None, 'minY': None, 'maxY': None,
+                'sumX': 0, 'sumY': 0, 'sumXX': 0, 'sumYY': 0}
+    for i in range(len(seedX)):
+        depositGeometry(geometry, int(seedX[i]), int(seedY[i]))
+
+    return geometry
+
+# Add a deposited particle to the running sums
+def depositGeometry(geometry, x, y):
+
+    if geometry['count'] == 0:
+        geometry['minX'] = geometry['maxX'] = x
+        geometry['minY'] = geometry['maxY'] = y
+    geometry['count'] += 1
+    # Bounding box
+    geometry['minX'] = min(geometry['minX'], x)
+    geometry['maxX'] = max(geometry['maxX'], x)
+    geometry['minY'] = min(geometry['minY'], y)
+    geometry['maxY'] = max(geometry['maxY'], y)
+    # Sums for the radius of gyration
+    geometry['sumX'] += x
+    geometry['sumY'] += y
+    geometry['sumXX'] += x*x
+    geometry['sumYY'] += y*y
+
+    return geometry
+
+# Area (max(x)-min(x))*(max(y)-min(y)) of the bounding box
+def clusterArea(geometry):
+    return (geometry['maxX'] - geometry['minX'])*(geometry['maxY'] - geometry['minY'])
+
+# Root mean square distance of the particles from their centre of mass
+def gyrationRadius(geometry):
+
+    count = geometry['count']
+    meanX = geometry['sumX']/count
+    meanY = geometry['sumY']/count
+    variance = geometry['sumXX']/count - meanX**2 + geometry['sumYY']/count - meanY**2
+
+    return max(variance, 0)**(1/2)
+
+# Names of the samples recorded in the history
+historyNames = ['mass', 'radius', 'gyration', 'minX', 'maxX', 'minY', 'maxY']
+
+# Append a sample of the current geometry to the history
+def recordGeometry(history, geometry, mass, radius):
+
+    if not history:
+        for name in historyNames:
+            history[name] = []
+    history['mass'].append(mass)
+    history['radius'].append(radius)
+    history['gyration'].append(gyrationRadius(geometry))
+    for name in ['minX', 'maxX', 'minY', 'maxY']:
+        history[name].append(geometry[name])
+
+    return history
+
+# History as arrays, one entry per sample
+def historyArrays(history):
+    return {name: numpy.array(history.get(name, [])) for name in historyNames}
@@ -0,0 +1,97 @@
+"""
+columnTops.py - index of the topmost sites in every column of the matrix,
+used by DLACluster.py for the stop conditions after each layer instead of
+scanning the top rows and every column of the matrix.
+
+Two heights are kept for each column (rows 1 and above, -1 if none):
+surface: topmost layer site, solid or solution (2, 3, 4)
+cover: topmost site which is neither gel nor solution (1, 2, 3, 6) - the
+       cluster is not enclosed while it is the cover of some column
+
+The index is built once, then kept up to date when a particle is deposited
+and for the band of rows changed by each layer.
+
+INPUTS: columnTops(matrix, squareSize)
+        depositTops(tops, matrix, x, y)
+        layerTops(tops, matrix, rowMin, rowMax)
+        surfaceAtEdge(tops, squareSize)
+        clusterNotEnclosed(tops, matrix, squareSize)
+        coverTop(tops)
+
+matrix: matrix representation of simulation (matrix)
+squareSize: dimensions of simulation square (int)
+tops: heights of the topmost sites in every column (dict of arrays)
+x, y: position of a deposited particle (int)
+rowMin, rowMax: range of rows changed by a layer (int)
+
+OUTPUTS:
+
+tops: heights of the topmost sites in every column (dict of arrays)
+surfaceAtEdge: surface is near the top of the square (bool)
+clusterNotEnclosed: cluster is not completely enclosed in silica (bool)
+coverTop: highest cover of all columns - only gel and solution lie above
+          it (int)
+"""
+
+import numpy
+
+# Codes of the sites counted by each height
+topCodes = {'surface': (2, 3, 4), 'cover': (1, 2, 3, 6)}
+
+# Topmost row in rows rowMin to rowMax - 1 holding one of codes, -1 if none
+def topRows(matrix, codes, rowMin, rowMax, columns=slice(None)):
+
+    band = numpy.isin(matrix[rowMin:rowMax, columns], codes)
+    if len(band) == 0:
+        return numpy.full(band.shape[1:], -1)
+    # First hit from the top of the band
+    top = rowMax - 1 - numpy.argmax(band[::-1], axis=0)
+
+    return numpy.where(band.any(axis=0), top, -1)
+
+# Build the index for the whole matrix
+def columnTops(matrix, squareSize):
+    return {name: topRows(matrix, codes, 1, squareSize) for name, codes in topCodes.items()}
+
+# Update the index after a particle is deposited at (x, y)
+def depositTops(tops, matrix, x, y):
+
+    # Particle covers the column
+    tops['cover'][x] = max(tops['cover'][x], y)
+    # Solution under the particle is gone - look for the next surface site below
+    if tops['surface'][x] == y:
+        tops['surface'][x] = topRows(matrix, topCodes['surface'], 1, y, x)
+
+    return tops
+
+# Update the index for rows rowMin to rowMax - 1 changed by a layer
+def layerTops(tops, matrix, rowMin, rowMax):
+
+    rowMin = max(rowMin, 1)
+    for name, codes in topCodes.items():
+        top = tops[name]
+        bandTop = topRows(matrix, codes, rowMin, rowMax)
+        # Columns whose top is above the band keep it
+        below = top < rowMax
+        top[below & (bandTop >= 0)] = bandTop[below & (bandTop >= 0)]
+        # Columns whose top in the band was removed - look below the band
+        lost = numpy.flatnonzero(below & (bandTop < 0) & (top >= rowMin))
+        if len(lost) > 0:
+            top[lost] = topRows(matrix, codes, 1, rowMin, lost)
+
+    return tops
+
+# Surface near the top of the square (solid or solution in the top 15 rows)
+def surfaceAtEdge(tops, squareSize):
+    return bool(numpy.any(tops['surface'][:squareSize - 1] >= squareSize - 15))
+
+# Cluster is the topmost non-gel, non-solution site of some column
+def clusterNotEnclosed(tops, matrix, squareSize):
+
+    columns = numpy.flatnonzero(tops['cover'][:squareSize - 1] >= 0)
+
+    return bool(numpy.any(matrix[tops['cover'][columns], columns] == 1))
+
+# Highest cover of all columns (the launch line of DLACluster.py is put above it)
+def coverTop(tops):
+    return int(numpy.max(tops['cover']))
@@ -1,83 +1,200 @@
 """
 countIslands.py - count the number of silica islands in simulation area for
-measure of anastomosis, contains function to implement bfs algorithm
-iteratively. 
-
-INPUTS: countIslands(matrix, squareSize)
-
-matrix: matrix representing simulation area (matrix)
+measure of anastomosis. Islands are connected components of silica sites (any
+site other than metal-oxide), labelled with a two-pass union-find over the
+runs of silica sites in each row: the first pass joins runs which touch runs
+in the row below, the second pass gives every run the label of its root.
+
+Sites on the edges of the square only connect to neighbours inside the square.
+
+Layers only change silica into silica, so islands change only where metal
+oxide is deposited - and oxide is only deposited on solution, near the
+surface. IslandTracker keeps the islands of the rows below a frozen line
+(the lowest row holding solution when islands were last counted) and only
+relabels the rows above it; islands crossing the frozen line are joined
+through the labels of its top row (the seam). If oxide is ever deposited
+below the frozen line, the tracker starts again from the whole square.
+
+INPUTS: countIslands(matrix, squareSize, connectivity)
+        labelIslands(matrix, connectivity)
+        IslandTracker(squareSize, connectivity)
+        IslandTracker.deposit(y)
+        IslandTracker.count(matrix)
+
+matrix: matrix representing simulation area, not modified (array)
 squareSize: dimensions of simulation square (int)
+connectivity: 4 (Von Neumann) or 8 (Moore) neighbours of a site (int)
+y: row of a deposited oxide particle (int)
 
 
 OUTPUTS:
 
 islands: number of distinct silica islands in the simulation (int)
+labels: island of every site, numbered from 1 (0 for metal-oxide) (array)
+sizes: number of sites in each island (array)
+boxes: rows rowMin to rowMax - 1 and columns colMin to colMax - 1 of each
+       island, as rows (rowMin, rowMax, colMin, colMax) (array)
 
 """
 
-import math
 import numpy
-import random
 
 
 # Count islands in matrix (to quantify anastomosis)
-def countIslands(matrix, squareSize):
-    # Make matrix binary (0 = silica [any state] , 1 = metal-oxide)
-    for i in range(squareSize):
-        for j in range(squareSize):
-            if matrix[i][j] != 1:
-                matrix[i][j] = 0
-    if not matrix:
-        return 0
-
-    # Dictionary of visited sites
-    visited = {}
-
-    # Initiate variable for islands
-    islands = 0
-
-    row = squareSize
-    col = squareSize
-    for i in range (squareSize):
-        for j in range (squareSize):
-            # Unvisited silica site - add one to island variable
-            # Fill Island with bfs algorithm
-            if matrix[i][j] == (0) and (i,j) not in visited:
-                bfs(matrix, i, j, row, col, visited)
-                islands +=1
-
-    # Number of silica 'islands' in simulation 
-    return islands
-
-# Iterative breadth first search algorithm for use in countIslands
-def bfs(matrix, i, j, row, col, visited):
-
-    # Sites to visit 
-    queue = [(i,j)]
-
-    # Conduct bfs algorithm
-    while queue:
-        # Sites to visit next
-        next = []
-        for u in queue:
-            # Site must not have already been visited
-            if u not in visited:
-                visited[u] = 1
-                # Adjacent unvisited silica sites to visit next
-                if u[1] + 1 < col and matrix[u[0]][u[1]+1] == (0):
-                    next.append((u[0], u[1]+1))
-                if u[1] - 1 > 0 and matrix[u[0]][u[1]-1] == (0):
-                    next.append((u[0], u[1]-1))
-                if u[0] + 1 < col and matrix[u[0] + 1][u[1]] == (0):
-                    next.append((u[0] + 1, u[1]))
-                if u[0] + 1 > 0 and matrix[u[0] - 1][u[1]] == (0):
-                    next.append((u[0] - 1, u[1]))
-        # Update sites to visit
-        queue = next
-        
-        
-        
-        
-        
-
-
+def countIslands(matrix, squareSize, connectivity=4):
+    return labelIslands(matrix, connectivity)[0]
+
+# Label the islands of silica sites in matrix
+def labelIslands(matrix, connectivity=4):
+
+    rows, cols = matrix.shape
+    runRow, runStart, runEnd = silicaRuns(matrix, 0, rows)
+    runs = len(runRow)
+    if runs == 0:
+        return (0, numpy.zeros((rows, cols), dtype=numpy.int32), numpy.zeros(0, dtype=int), numpy.zeros((0, 4), dtype=int))
+
+    # First pass - join touching runs
+    parent = list(range(runs))
+    joinRuns(parent, *touchingRuns(runRow, runStart, runEnd, cols, connectivity))
+
+    # Second pass - label every run with its root, islands numbered from 1
+    runLabel = rootLabels(parent) + 1
+    islands = int(runLabel.max())
+
+    # Paint the labels of the runs
+    lengths = runEnd - runStart
+    labels = numpy.zeros((rows, cols), dtype=numpy.int32)
+    offsets = numpy.arange(lengths.sum()) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+    labels.ravel()[numpy.repeat(runRow*cols + runStart, lengths) + offsets] = numpy.repeat(runLabel, lengths)
+
+    # Size and bounding box of every island
+    sizes = numpy.bincount(runLabel, weights=lengths, minlength=islands + 1)[1:].astype(int)
+    boxes = numpy.zeros((islands, 4), dtype=int)
+    boxes[:, 0] = rows
+    boxes[:, 2] = cols
+    numpy.minimum.at(boxes[:, 0], runLabel - 1, runRow)
+    numpy.maximum.at(boxes[:, 1], runLabel - 1, runRow + 1)
+    numpy.minimum.at(boxes[:, 2], runLabel - 1, runStart)
+    numpy.maximum.at(boxes[:, 3], runLabel - 1, runEnd)
+
+    return (islands, labels, sizes, boxes)
+
+# Runs of silica sites in rows rowMin to rowMax - 1, in order of rows and columns
+def silicaRuns(matrix, rowMin, rowMax):
+
+    silica = numpy.zeros((rowMax - rowMin, matrix.shape[1] + 2), dtype=numpy.int8)
+    silica[:, 1:-1] = matrix[rowMin:rowMax] != 1
+    edges = numpy.diff(silica, axis=1)
+    runRow, runStart = numpy.nonzero(edges == 1)
+    runEnd = numpy.nonzero(edges == -1)[1]
+
+    return (runRow + rowMin, runStart, runEnd)
+
+# Pairs of runs touching in consecutive rows (diagonally too for 8-connectivity)
+def touchingRuns(runRow, runStart, runEnd, cols, connectivity):
+
+    reach = 1 if connectivity == 8 else 0
+    width = cols + 2
+    startKey = runRow*width + runStart
+    endKey = runRow*width + runEnd
+    # Runs in the row below which overlap each run form a range of runs
+    first = numpy.searchsorted(endKey, (runRow - 1)*width + runStart - reach, side='right')
+    last = numpy.searchsorted(startKey, (runRow - 1)*width + runEnd + reach, side='left')
+    touching = numpy.maximum(last - first, 0)
+    upper = numpy.repeat(numpy.arange(len(runRow)), touching)
+    lower = numpy.repeat(first, touching) + numpy.arange(touching.sum()) - numpy.repeat(numpy.cumsum(touching) - touching, touching)
+
+    return (upper, lower)
+
+# Join pairs of runs in the union-find forest
+def joinRuns(parent, upper, lower):
+    for a, b in zip(upper.tolist(), lower.tolist()):
+        a = findRoot(parent, a)
+        b = findRoot(parent, b)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+# Label of the root of every run, numbered from 0
+def rootLabels(parent):
+    roots = numpy.array([findRoot(parent, run) for run in range(len(parent))])
+    return numpy.unique(roots, return_inverse=True)[1].reshape(-1)
+
+# Root of a run in the union-find forest (with path halving)
+def findRoot(parent, run):
+    while parent[run] != run:
+        parent[run] = parent[parent[run]]
+        run = parent[run]
+    return run
+
+# Islands of the square, relabelling only the rows above a frozen line
+class IslandTracker:
+
+    def __init__(self, squareSize, connectivity=4):
+        self.squareSize = squareSize
+        self.connectivity = connectivity
+        self.reset()
+
+    # Forget the frozen rows
+    def reset(self):
+        # Rows below frozenLine are labelled, closed islands lie entirely below it
+        self.frozenLine = 0
+        self.closed = 0
+        # Island of each run in the top frozen row (the seam)
+        self.seamLabels = numpy.zeros(0, dtype=int)
+        # Lowest row where oxide was deposited since the last count
+        self.lowestDeposit = self.squareSize
+
+    # Oxide deposited in row y
+    def deposit(self, y):
+        self.lowestDeposit = min(self.lowestDeposit, y)
+
+    # Number of islands in matrix
+    def count(self, matrix):
+
+        if self.lowestDeposit < self.frozenLine:
+            self.reset()
+        self.lowestDeposit = self.squareSize
+
+        # Runs of the seam and of the rows above it
+        rowMin = max(self.frozenLine - 1, 0)
+        runRow, runStart, runEnd = silicaRuns(matrix, rowMin, self.squareSize)
+        upper, lower = touchingRuns(runRow, runStart, runEnd, matrix.shape[1], self.connectivity)
+        # Runs of the seam in the same frozen island are joined below the frozen line
+        seamUpper, seamLower = self.seamJoins(runRow == rowMin)
+        parent = list(range(len(runRow)))
+        joinRuns(parent, upper, lower)
+        joinRuns(parent, seamUpper, seamLower)
+        runLabel = rootLabels(parent)
+        islands = self.closed + (int(runLabel.max()) + 1 if len(runLabel) > 0 else 0)
+
+        # Move the frozen line up to the lowest row holding solution
+        solution = numpy.flatnonzero((matrix[self.frozenLine:] == 4).any(axis=1))
+        frozenLine = self.frozenLine + solution[0] if len(solution) > 0 else self.squareSize
+        if frozenLine > self.frozenLine:
+            # Islands of the rows below the new frozen line only (rows above
+            # it can still be cut by oxide), runs being in order of rows
+            frozen = int(numpy.searchsorted(runRow, frozenLine))
+            parent = list(range(frozen))
+            joinRuns(parent, upper[upper < frozen], lower[upper < frozen])
+            joinRuns(parent, seamUpper, seamLower)
+            frozenLabel = rootLabels(parent) if frozen > 0 else numpy.zeros(0, dtype=int)
+            # Islands with no run in the new seam are closed
+            seam = runRow[:frozen] == frozenLine - 1
+            reaching = numpy.zeros(int(frozenLabel.max()) + 1 if frozen > 0 else 0, dtype=bool)
+            reaching[frozenLabel[seam]] = True
+            self.closed += int(numpy.count_nonzero(~reaching))
+            self.seamLabels = frozenLabel[seam]
+            self.frozenLine = frozenLine
+
+        return islands
+
+    # Pairs of seam runs (given by a mask of the runs) in the same frozen island
+    def seamJoins(self, seam):
+
+        if self.frozenLine == 0:
+            return (numpy.zeros(0, dtype=int), numpy.zeros(0, dtype=int))
+        seam = numpy.flatnonzero(seam)
+        order = numpy.argsort(self.seamLabels, kind='stable')
+        same = numpy.flatnonzero(numpy.diff(self.seamLabels[order]) == 0)
+
+        return (seam[order[same + 1]], seam[order[same]])
@@ -0,0 +1,127 @@
+"""
+distanceField.py - distance field used by DLACluster.py to let walkers in
+empty regions of the simulation jump ahead instead of taking unit steps.
+
+The field holds, for every site, the Manhattan distance to the nearest site
+where a walker stops or dies: solid silica (2, 3, 6), the metal oxide
+cluster and the sites touching it, and the edge of the square (as in
+checkAround). Distances are capped at fieldCap. A walker on a site with
+field value D cannot reach any such site in fewer than D unit steps, so
+instead of D - 1 unit steps it can make one jump with the same distribution.
+In rotated coordinates u = x + y, v = x - y each unit step changes u and v
+by +-1 independently, so after n steps (u + n)/2 and (v + n)/2 are
+independent Binomial(n, 1/2) numbers. Walkers within jumpMargin of an
+obstacle take unit steps as before.
+
+The field is built once, then kept up to date as particles are deposited
+and layers are added - sites only ever become obstacles, so updates only
+lower the field near the sites that changed. Distances up to fieldCap take
+one byte per site.
+
+INPUTS: distanceField(matrix, squareSize)
+        depositField(field, x, y, squareSize)
+        updateField(field, matrix, squareSize, rowMin, rowMax)
+        jumpWalker(x, y, field, rng)
+
+matrix: matrix representation of simulation (matrix)
+squareSize: dimensions of simulation square (int)
+field: distance field of the simulation (array)
+x, y: position of a deposited particle or of walkers (int or arrays)
+rowMin, rowMax: range of rows changed by a layer (int)
+rng: random number generator of the run (Generator)
+
+OUTPUTS:
+
+field: distance field of the simulation (array)
+x, y: positions of walkers after jumping (arrays)
+steps: number of unit steps made by each jump (array)
+"""
+
+import numpy
+from checkAround import solidCodes
+
+# Largest distance stored in the field (limits the length of one jump)
+fieldCap = 32
+# One byte per site holds every distance up to fieldCap
+fieldType = numpy.uint8
+# Walkers this close to an obstacle take unit steps
+jumpMargin = 4
+
+# Manhattan distance from the centre of a window around a deposited particle
+window = numpy.arange(-fieldCap, fieldCap + 1)
+windowDistance = numpy.abs(window)[:, None] + numpy.abs(window)[None, :]
+# Field around a deposited particle (its neighbours at distance 0)
+windowField = numpy.maximum(windowDistance - 1, 0).astype(fieldType)
+
+# Build the distance field of a whole simulation
+def distanceField(matrix, squareSize):
+    return fieldRows(matrix, squareSize, 0, squareSize)
+
+# Lower the field around a particle deposited at (x, y)
+def depositField(field, x, y, squareSize):
+
+    # Rows and columns of the window inside the square
+    rowMin = max(y - fieldCap, 0)
+    rowMax = min(y + fieldCap + 1, squareSize)
+    colMin = max(x - fieldCap, 0)
+    colMax = min(x + fieldCap + 1, squareSize)
+    distance = windowField[rowMin - y + fieldCap:rowMax - y + fieldCap,
+                           colMin - x + fieldCap:colMax - x + fieldCap]
+    # Particle and its neighbours are now obstacles
+    region = field[rowMin:rowMax, colMin:colMax]
+    numpy.minimum(region, distance, out=region)
+
+    return field
+
+# Lower the field around rows rowMin to rowMax - 1 changed by a layer
+def updateField(field, matrix, squareSize, rowMin, rowMax):
+
+    # Sites further than fieldCap from the change keep their value
+    rowMin = max(rowMin - fieldCap, 0)
+    rowMax = min(rowMax + fieldCap, squareSize)
+    numpy.minimum(field[rowMin:rowMax], fieldRows(matrix, squareSize, rowMin, rowMax), out=field[rowMin:rowMax])
+
+    return field
+
+# Distance field of rows rowMin to rowMax - 1, counting obstacles in these rows only
+def fieldRows(matrix, squareSize, rowMin, rowMax):
+
+    rows = numpy.arange(rowMin, rowMax)
+    cluster = matrix == 1
+    # Sites touching the cluster, or part of it
+    nearCluster = cluster[rowMin:rowMax].copy()
+    nearCluster[:, 1:] |= cluster[rowMin:rowMax, :-1]
+    nearCluster[:, :-1] |= cluster[rowMin:rowMax, 1:]
+    nearCluster |= cluster[numpy.maximum(rows - 1, 0)] & (rows > 0)[:, None]
+    nearCluster |= cluster[numpy.minimum(rows + 1, squareSize - 1)] & (rows < squareSize - 1)[:, None]
+    # Sites near the edge of the square (as in checkAround)
+    nearEdge = ((rows + 1) > squareSize - 5) | ((rows - 1) < 1)
+    obstacle = nearCluster | numpy.isin(matrix[rowMin:rowMax], solidCodes) | nearEdge[:, None]
+    obstacle[:, :2] = True
+    obstacle[:, squareSize - 1:] = True
+
+    field = numpy.where(obstacle, 0, fieldCap).astype(fieldType)
+    # Manhattan distance transform: sweeps along rows, then along columns
+    for j in range(1, squareSize):
+        numpy.minimum(field[:, j], field[:, j - 1] + 1, out=field[:, j])
+    for j in range(squareSize - 2, -1, -1):
+        numpy.minimum(field[:, j], field[:, j + 1] + 1, out=field[:, j])
+    for i in range(1, len(rows)):
+        numpy.minimum(field[i], field[i - 1] + 1, out=field[i])
+    for i in range(len(rows) - 2, -1, -1):
+        numpy.minimum(field[i], field[i + 1] + 1, out=field[i])
+
+    return field
+
+# Jump walkers by field - 1 unit steps in one go
+def jumpWalker(x, y, field, rng):
+
+    # Step counts as int (the field is bytes)
+    steps = field[y, x].astype(int) - 1
+    # Independent binomial steps along the diagonals
+    diagonalU = rng.binomial(steps, 0.5)
+    diagonalV = rng.binomial(steps, 0.5)
+    x = x + diagonalU + diagonalV - steps
+    y = y + diagonalU - diagonalV
+
+    return (x, y, steps)
@@ -0,0 +1,98 @@
+"""
+eventLog.py - log of the depositions of a run, in order: which walker
+stuck where, with which alignment, next to which neighbour, after how many
+steps and on top of how many layers.
+
+Events are fixed-size binary records (see eventType, 22 bytes, no padding)
+packed into a buffer and appended to the log file when the buffer is full,
+so logging an event costs one struct.pack_into. The file is a raw array of
+records and is read back as a structured NumPy array mapped into memory.
+
+For a checkpoint of the run (see checkpoint.py) the log gives its length so
+far, and the log of the resumed run cuts the file back to it.
+
+INPUTS: EventLog(path, bufferEvents, resume)
+        EventLog.log(walker, x, y, alignment, orientation, steps, layer)
+        EventLog.logMany(walker, x, y, alignment, orientation, steps, layer)
+        EventLog.state()
+        EventLog.close()
+        readEvents(path)
+
+path: path of the log file (str)
+bufferEvents: number of events buffered before they are written (int)
+resume: state of the log at a checkpoint, None for a new log (dict)
+walker: index of the walker, in order of release from 1 (int or array)
+x, y: position of the deposited particle (int or array)
+alignment: crystallographic alignment of the particle, 1 - 4 (int or array)
+orientation: neighbour in the cluster it stuck to, as in checkAround:
+             0 below, 1 above, 2 right, 3 left (int or array)
+steps: number of unit steps taken by the walker (int or array)
+layer: number of layers in the simulation (int or array)
+
+OUTPUTS:
+
+events: every event of the log (array of eventType)
+"""
+
+import struct
+import numpy
+from frameHistory import mapFile
+
+# Record of an event, and the same record for struct
+eventType = numpy.dtype([('walker', '<i8'), ('x', '<u2'), ('y', '<u2'), ('alignment', 'u1'),
+                         ('orientation', 'u1'), ('steps', '<u4'), ('layer', '<u4')])
+eventRecord = struct.Struct('<qHHBBII')
+
+# Append-only log of deposition events, written in buffered binary records
+class EventLog:
+
+    def __init__(self, path, bufferEvents=4096, resume=None):
+        if resume is None:
+            self.file = open(path, 'wb')
+        else:
+            # Events logged after the checkpoint are dropped
+            self.file = open(path, 'r+b')
+            self.file.truncate(resume['length'])
+            self.file.seek(resume['length'])
+        self.buffer = bytearray(eventRecord.size*bufferEvents)
+        self.end = len(self.buffer)
+        # Bytes of the buffer in use
+        self.used = 0
+
+    # Log one event
+    def log(self, walker, x, y, alignment, orientation, steps, layer):
+        eventRecord.pack_into(self.buffer, self.used, walker, x, y, alignment, orientation, steps, layer)
+        self.used += eventRecord.size
+        if self.used == self.end:
+            self.flush()
+
+    # Log events given as arrays (in order)
+    def logMany(self, walker, x, y, alignment, orientation, steps, layer):
+
+        events = numpy.zeros(len(x), dtype=eventType)
+        for name, values in zip(eventType.names, (walker, x, y, alignment, orientation, steps, layer)):
+            events[name] = values
+        self.flush()
+        self.file.write(events.tobytes())
+
+    # Write the buffered events
+    def flush(self):
+        self.file.write(self.buffer[:self.used])
+        self.used = 0
+
+    # Length of the log so far, for a checkpoint
+    def state(self):
+
+        self.flush()
+        self.file.flush()
+
+        return {'length': self.file.tell()}
+
+    # Write the buffered events and close the file
+    def close(self):
+        self.flush()
+        self.file.close()
+
+# Every event of a log file, mapped into memory
+def readEvents(path):
+    return mapFile(path, eventType)
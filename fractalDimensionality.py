@@ -19,6 +19,7 @@ import math
 import matplotlib.pyplot as plt
 from scipy.optimize import curve_fit
 import random
+from rngStreams import replicaSeeds
 
 def main():
 
@@ -46,6 +47,10 @@ def main():
     densityAv = []
     # Error on density
     densityError = []
+    # Root seed of the sweep - every trial gets its own stream spawned from it,
+    # trial k can be rerun alone with seed=rngStreams.replicaSeed(rootSeed, k)
+    rootSeed = 20190401
+    trialSeeds = replicaSeeds(rootSeed, 18*10)
 
     for j in range(3, 21):
         print(j)
@@ -63,8 +68,9 @@ def main():
         densityList = []
 
         for i in range (10):
-            print("trial " + str(i + 1) + " out of 10")
-            massValue, radiusValue, clusterArea, matrix, islands = DLAcluster(200, False, 1000, j*5, 1, 1, 1) 
+            trial = (j - 3)*10 + i
+            print("trial " + str(i + 1) + " out of 10 (replica " + str(trial) + ")")
+            massValue, radiusValue, clusterArea, matrix, islands, history, layers, stats = DLAcluster(200, False, 1000, j*5, 1, 1, 1, 1, 9, seed=trialSeeds[trial])
             massArray.append(massValue)
             radiusArray.append(radiusValue)
             anastPerArray.append((islands - 1)/massValue)
@@ -0,0 +1,162 @@
+"""
+frameHistory.py - history of the lattice on disk, recorded at every layer (or
+every snapshot) of a run so that intermediate states can be looked at after
+the run without running it again.
+
+Every frame is the matrix and the matrix of alignments packed into one byte
+per site (see latticeState.py). Only a band of the lattice changes between
+two frames, so every keyframeInterval-th frame is stored whole and the other
+frames are stored as the sites which changed since the frame before (flat
+index and packed value). A directory holds four raw files:
+
+keyframes.u8: squareSize (int64), then the stack of keyframes (uint8,
+              squareSize by squareSize each)
+deltaIndex.u4: flat index of every changed site (uint32)
+deltaValue.u8: packed value of every changed site (uint8)
+frames.rec: record of every frame (see frameType)
+
+The files are only appended to, the record of a frame last, so a history
+can be read while it is written (or after the run died) up to its last
+complete frame. The reader maps the files into memory and builds frame k
+from its keyframe and at most keyframeInterval - 1 deltas. For a checkpoint
+of the run (see checkpoint.py) the writer gives the lengths of the files so
+far, and the writer of the resumed run cuts the files back to them.
+
+INPUTS: HistoryWriter(directory, squareSize, keyframeInterval, resume)
+        HistoryWriter.record(matrix, alignMatrix, walkers, mass, layers)
+        HistoryWriter.state()
+        HistoryWriter.close()
+        HistoryReader(directory)
+        HistoryReader.frame(k)
+
+directory: directory of the history (str)
+squareSize: dimensions of simulation square (int)
+keyframeInterval: number of frames per keyframe (int)
+resume: state of the writer at a checkpoint, None for a new history (dict)
+matrix: matrix representation of simulation (array)
+alignMatrix: matrix of crystallographic alignments (array)
+walkers, mass, layers: walkers released, particles added to the cluster and
+                       layers added when the frame was recorded (int)
+k: index of a frame, from 0 (int)
+
+OUTPUTS:
+
+frames: record of every frame (array of frameType)
+matrix, alignMatrix: site codes and alignments of frame k (arrays)
+"""
+
+import os
+import numpy
+from latticeState import latticeType, packLattice, unpackLattice
+
+# Record of a frame: its keyframe, its deltas and the state of the run
+frameType = numpy.dtype([('keyframe', '<i8'), ('deltaStart', '<i8'), ('deltaEnd', '<i8'),
+                         ('walkers', '<i8'), ('mass', '<i8'), ('layers', '<i8')])
+# Files of a history
+historyFiles = {'keyframes': 'keyframes.u8', 'deltaIndex': 'deltaIndex.u4', 'deltaValue': 'deltaValue.u8', 'frames': 'frames.rec'}
+
+# Append frames of a run to a history on disk
+class HistoryWriter:
+
+    def __init__(self, directory, squareSize, keyframeInterval=16, resume=None):
+        self.squareSize = squareSize
+        self.keyframeInterval = keyframeInterval
+        # Frames, keyframes and deltas written so far
+        self.frameCount = 0
+        self.keyframeCount = 0
+        self.deltaCount = 0
+        # Last frame written, to find the sites which change
+        self.previous = None
+        if resume is None:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.files = {name: open(os.path.join(directory, filename), 'wb') for name, filename in historyFiles.items()}
+            self.files['keyframes'].write(numpy.array(squareSize, dtype='<i8').tobytes())
+        else:
+            # Frames written after the checkpoint are dropped
+            self.files = {name: open(os.path.join(directory, filename), 'r+b') for name, filename in historyFiles.items()}
+            for name, file in self.files.items():
+                file.truncate(resume['lengths'][name])
+                file.seek(resume['lengths'][name])
+            self.frameCount, self.keyframeCount, self.deltaCount = resume['counts']
+            self.previous = resume['previous']
+
+    # Lengths of the files and frames so far, for a checkpoint
+    def state(self):
+
+        for file in self.files.values():
+            file.flush()
+
+        return {'lengths': {name: file.tell() for name, file in self.files.items()},
+                'counts': (self.frameCount, self.keyframeCount, self.deltaCount), 'previous': self.previous}
+
+    # Append the lattice as a frame
+    def record(self, matrix, alignMatrix, walkers, mass, layers):
+
+        packed = packLattice(matrix, alignMatrix)
+        start = self.deltaCount
+        if self.frameCount%self.keyframeInterval == 0:
+            self.files['keyframes'].write(packed.tobytes())
+            self.keyframeCount += 1
+        else:
+            changed = numpy.flatnonzero(packed != self.previous)
+            self.files['deltaIndex'].write(changed.astype('<u4').tobytes())
+            self.files['deltaValue'].write(packed.ravel()[changed].tobytes())
+            self.deltaCount += len(changed)
+        self.previous = packed
+
+        # Data of the frame first, then its record
+        frame = numpy.array([(self.keyframeCount - 1, start, self.deltaCount, walkers, mass, layers)], dtype=frameType)
+        for name in ['keyframes', 'deltaIndex', 'deltaValue']:
+            self.files[name].flush()
+        self.files['frames'].write(frame.tobytes())
+        self.files['frames'].flush()
+        self.frameCount += 1
+
+    # Close the files of the history
+    def close(self):
+        for file in self.files.values():
+            file.close()
+
+# Random access to the frames of a history on disk
+class HistoryReader:
+
+    def __init__(self, directory):
+        paths = {name: os.path.join(directory, filename) for name, filename in historyFiles.items()}
+        # Complete frames only
+        self.frames = mapFile(paths['frames'], frameType)
+        keyframes = int(self.frames['keyframe'][-1]) + 1 if len(self.frames) > 0 else 0
+        self.deltaIndex = mapFile(paths['deltaIndex'], '<u4')
+        self.deltaValue = mapFile(paths['deltaValue'], latticeType)
+        keyframeData = mapFile(paths['keyframes'], latticeType)
+        self.squareSize = int(numpy.frombuffer(keyframeData[:8].tobytes(), dtype='<i8')[0])
+        self.keyframes = keyframeData[8:8 + keyframes*self.squareSize**2].reshape(keyframes, self.squareSize, self.squareSize)
+
+    # Number of frames in the history
+    def __len__(self):
+        return len(self.frames)
+
+    # Site codes and alignments of frame k
+    def frame(self, k):
+
+        if k < 0:
+            k += len(self.frames)
+        keyframe = int(self.frames['keyframe'][k])
+        packed = numpy.array(self.keyframes[keyframe])
+        # Deltas of the frames after the keyframe, in order
+        first = int(numpy.searchsorted(self.frames['keyframe'], keyframe)) + 1
+        for record in self.frames[first:k + 1]:
+            start, end = int(record['deltaStart']), int(record['deltaEnd'])
+            packed.ravel()[self.deltaIndex[start:end]] = self.deltaValue[start:end]
+
+        return unpackLattice(packed)
+
+# Memory map of a raw file of records (empty if the file is empty)
+def mapFile(path, dtype):
+
+    dtype = numpy.dtype(dtype)
+    count = os.path.getsize(path)//dtype.itemsize
+    if count == 0:
+        return numpy.zeros(0, dtype=dtype)
+
+    return numpy.memmap(path, dtype=dtype, mode='r', shape=(count,))
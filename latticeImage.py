@@ -0,0 +1,320 @@
+"""
+latticeImage.py - images of the simulation without matplotlib. Lattice codes
+are mapped straight to the colours of the snapshots (navy, white, orange,
+green, black) with a lookup table, and the frames are written as indexed
+PNG files (one byte per pixel and a palette) or streamed into an animated
+GIF by a writer thread, so that the simulation only waits for the copy of
+the matrix.
+
+Frames are shown as matplotlib's matshow shows the matrix (row 0 at the top),
+one pixel per site; they can be downsampled (every downsample-th site of
+every downsample-th row) and then upscaled (every site shown as an upscale
+by upscale block of pixels). Silica on the cluster (6) is shown in black, as
+the highest code was with matshow.
+
+With the writer, at most maxFrames frames wait to be written: saving a frame
+blocks while the queue is full, so the frames cannot build up in memory.
+Frames of colours (snapshots drawn by matplotlib) are saved as truecolour
+PNG files, so the drawing is done by the caller and only the encoding by
+the writer (pyplot must stay on the main thread).
+AnimationWriter appends every frame to the GIF as it comes (compressed with
+LZW, the palette of the snapshots as colour table), so no frame is kept
+after it is written. It keeps every frameStride-th frame, at most frameCap
+frames, the last frame (final=True) always being kept. Frames drawn by
+matplotlib are quantised to the palette of the snapshots. For a checkpoint
+of the run (see checkpoint.py) the writer gives the length of the GIF so far,
+and the writer of the resumed run cuts the GIF back to it and goes on.
+
+INPUTS: indexedFrame(matrix, upscale, downsample)
+        rgbFrame(frame)
+        encodePNG(frame)
+        savePNG(filename, frame)
+        FrameWriter(maxFrames)
+        FrameWriter.save(filename, frame)
+        FrameWriter.close()
+        AnimationWriter(filename, maxFrames, frameCap, frameStride, delay, resume)
+        AnimationWriter.append(frame, final)
+        AnimationWriter.state()
+        AnimationWriter.close()
+        figureFrame(matrix)
+        quantiseFrame(rgb)
+
+matrix: matrix representation of simulation (array)
+upscale: number of pixels per site along each side (int)
+downsample: number of sites per pixel along each side (int)
+frame: palette index, or colour, of every pixel (array)
+filename: path of the image (str)
+maxFrames: largest number of frames waiting to be written (int)
+frameCap: largest number of frames in the animation, None for no limit (int)
+frameStride: number of frames per frame kept in the animation (int)
+delay: time between frames of the animation in hundredths of a second (int)
+final: last frame of the animation, always kept (bool)
+resume: state of the writer at a checkpoint, None for a new GIF (dict)
+rgb: colour of every pixel (array)
+
+OUTPUTS:
+
+frame: palette index of every pixel (array)
+rgb: colour of every pixel (array)
+png: PNG file (bytes)
+"""
+
+import queue
+import struct
+import threading
+import zlib
+import numpy
+
+# Colours of the snapshots (navy, white, orange, green, black)
+palette = numpy.array([[0, 0, 128], [255, 255, 255], [255, 165, 0], [0, 128, 0], [0, 0, 0]], dtype=numpy.uint8)
+# Palette index of every lattice code (gel, metal oxide, solid silica, solution, silica on the cluster)
+paletteIndex = numpy.full(256, 4, dtype=numpy.uint8)
+paletteIndex[:5] = [0, 1, 2, 3, 4]
+
+# Palette index of every pixel of a snapshot of matrix
+def indexedFrame(matrix, upscale=1, downsample=1):
+
+    frame = paletteIndex[matrix[::downsample, ::downsample]]
+    if upscale > 1:
+        frame = numpy.repeat(numpy.repeat(frame, upscale, axis=0), upscale, axis=1)
+
+    return frame
+
+# Colour of every pixel of a frame
+def rgbFrame(frame):
+    return palette[frame]
+
+# PNG file of a frame of palette indices (indexed colour), or of colours (truecolour)
+def encodePNG(frame):
+
+    height, width = frame.shape[:2]
+    # Every row starts with filter type 0 (none)
+    rows = numpy.zeros((height, frame[0].size + 1), dtype=numpy.uint8)
+    rows[:, 1:] = frame.reshape(height, -1)
+    if frame.ndim == 3:
+        header = pngChunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+    else:
+        header = pngChunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)) + pngChunk(b'PLTE', palette.tobytes())
+
+    return (b'\x89PNG\r\n\x1a\n' + header + pngChunk(b'IDAT', zlib.compress(rows.tobytes(), 6)) + pngChunk(b'IEND', b''))
+
+# Chunk of a PNG file (length, type, data, checksum)
+def pngChunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+# Write a frame to a PNG file
+def savePNG(filename, frame):
+    with open(filename, 'wb') as file:
+        file.write(encodePNG(frame))
+
+# LZW codes of a string of palette indices, packed as in a GIF file
+def lzwData(data, minCodeSize):
+
+    clear = 1 << minCodeSize
+    end = clear + 1
+    packed = bytearray()
+    bits = 0
+    count = 0
+    codeSize = minCodeSize + 1
+
+    # Codes are packed from the lowest bit
+    def emit(code):
+        nonlocal bits, count
+        bits |= code << count
+        count += codeSize
+        while count >= 8:
+            packed.append(bits & 255)
+            bits >>= 8
+            count -= 8
+
+    # Strings in the table are keyed by the code of their prefix and their last index
+    emit(clear)
+    table = {}
+    nextCode = end + 1
+    prefix = data[0]
+    for index in data[1:]:
+        key = (prefix << 8) | index
+        code = table.get(key)
+        if code is not None:
+            prefix = code
+            continue
+        emit(prefix)
+        prefix = index
+        if nextCode < 4096:
+            table[key] = nextCode
+            nextCode += 1
+            # Codes grow by a bit once the table needs it
+            if nextCode > (1 << codeSize) and codeSize < 12:
+                codeSize += 1
+        else:
+            # Table is full - start again
+            emit(clear)
+            table = {}
+            nextCode = end + 1
+            codeSize = minCodeSize + 1
+    emit(prefix)
+    emit(end)
+    if count > 0:
+        packed.append(bits & 255)
+
+    return bytes(packed)
+
+# Writer thread with a bounded queue of frames
+class FrameWriter:
+
+    def __init__(self, maxFrames=8):
+        self.queue = queue.Queue(maxFrames)
+        self.error = None
+        self.worker = threading.Thread(target=self.work, daemon=True)
+        self.worker.start()
+
+    # Queue a frame for a PNG file (waits while maxFrames frames are waiting)
+    def save(self, filename, frame):
+        self.put(savePNG, filename, frame)
+
+    # Queue a call writing a frame
+    def put(self, write, *args):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((write, args))
+
+    # Wait until the frames queued so far are written
+    def wait(self):
+        self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+    # Write the frames left and stop the thread
+    def close(self):
+
+        if self.worker is not None:
+            # Empty frame stops the worker
+            self.queue.put(None)
+            self.worker.join()
+            self.worker = None
+        if self.error is not None:
+            raise self.error
+
+    # Write frames until stopped
+    def work(self):
+
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            # After an error the remaining frames are skipped
+            if self.error is None:
+                try:
+                    item[0](*item[1])
+                except Exception as error:
+                    self.error = error
+            self.queue.task_done()
+
+# Animated GIF written frame by frame by a writer thread
+class AnimationWriter(FrameWriter):
+
+    def __init__(self, filename, maxFrames=8, frameCap=None, frameStride=1, delay=10, resume=None):
+        self.frameCap = frameCap
+        self.frameStride = frameStride
+        self.delay = delay
+        # Frames given and frames kept
+        self.given = 0
+        self.kept = 0
+        self.shape = None
+        if resume is None:
+            self.file = open(filename, 'wb')
+        else:
+            # Frames written after the checkpoint are dropped
+            self.file = open(filename, 'r+b')
+            self.file.truncate(resume['length'])
+            self.file.seek(resume['length'])
+            self.given, self.kept, self.shape = resume['given'], resume['kept'], resume['shape']
+        FrameWriter.__init__(self, maxFrames)
+
+    # Length of the GIF and frames so far, for a checkpoint
+    def state(self):
+
+        self.wait()
+        self.file.flush()
+
+        return {'length': self.file.tell(), 'given': self.given, 'kept': self.kept, 'shape': self.shape}
+
+    # Queue a frame of palette indices, or of colours (quantised to the palette)
+    def append(self, frame, final=False):
+
+        given = self.given
+        self.given += 1
+        if not final:
+            # Room is left for the last frame
+            if given%self.frameStride != 0 or (self.frameCap is not None and self.kept >= self.frameCap - 1):
+                return
+        self.kept += 1
+        self.put(self.writeFrame, frame)
+
+    # Write the frames left, end the GIF and close the file
+    def close(self):
+
+        try:
+            FrameWriter.close(self)
+        finally:
+            if not self.file.closed:
+                self.file.write(b'\x3b')
+                self.file.close()
+
+    # Append a frame to the GIF
+    def writeFrame(self, frame):
+
+        if frame.ndim == 3:
+            frame = quantiseFrame(frame)
+        height, width = frame.shape
+        if self.shape is None:
+            # Header, screen as large as the frames, palette padded to 8 colours, repeated forever
+            self.shape = frame.shape
+            colours = numpy.zeros((8, 3), dtype=numpy.uint8)
+            colours[:len(palette)] = palette
+            self.file.write(b'GIF89a' + struct.pack('<HHBBB', width, height, 0xf2, 0, 0) + colours.tobytes())
+            self.file.write(b'\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')
+        elif frame.shape != self.shape:
+            raise ValueError("Frames of an animation must have the same size")
+        # Delay of the frame, then the frame compressed in blocks of 255 bytes
+        data = lzwData(frame.tobytes(), 3)
+        blocks = b''.join(bytes([len(data[i:i + 255])]) + data[i:i + 255] for i in range(0, len(data), 255))
+        self.file.write(b'\x21\xf9\x04\x00' + struct.pack('<H', self.delay) + b'\x00\x00'
+                        + b'\x2c' + struct.pack('<HHHHB', 0, 0, width, height, 0) + b'\x03' + blocks + b'\x00')
+
+# Snapshot drawn with matplotlib (as matshow with the snapshot colours)
+def drawFigure(matrix):
+
+    import matplotlib.pyplot as plt
+    from matplotlib import colors
+
+    cmap = colors.ListedColormap(['navy', 'white', 'orange', 'green', 'black'], N=5)
+    plt.matshow(matrix, interpolation='nearest', cmap=cmap)
+    plt.axis('off')
+
+    return plt
+
+# Colours of a snapshot drawn with matplotlib (as savefig draws it at dpi 200)
+def figureFrame(matrix):
+
+    plt = drawFigure(matrix)
+    figure = plt.gcf()
+    figure.set_dpi(200)
+    figure.canvas.draw()
+    rgb = numpy.asarray(figure.canvas.buffer_rgba())[:, :, :3].copy()
+    plt.close()
+
+    return rgb
+
+# Palette index of the nearest colour of the snapshots to every pixel
+def quantiseFrame(rgb):
+
+    rgb = rgb.astype(int)
+    frame = numpy.zeros(rgb.shape[:2], dtype=numpy.uint8)
+    nearest = numpy.full(rgb.shape[:2], numpy.inf)
+    for index, colour in enumerate(palette.astype(int)):
+        distance = ((rgb - colour)**2).sum(axis=2)
+        frame[distance < nearest] = index
+        nearest = numpy.minimum(nearest, distance)
+
+    return frame
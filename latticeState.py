@@ -0,0 +1,43 @@
+"""
+latticeState.py - storage of the lattices of the simulation. The matrix, the
+KPZ matrix and the matrix of crystallographic alignments only hold small
+codes (0 - 6 and 1 - 4), so they are stored as one byte per site.
+
+For storage (e.g. saved histories of a run) the site code and the alignment
+of a site can be packed into a single byte: the code in the low four bits and
+the alignment in the high four bits.
+
+INPUTS: newLattice(squareSize)
+        packLattice(matrix, alignMatrix)
+        unpackLattice(packed)
+
+squareSize: dimensions of simulation square (int)
+matrix: matrix representation of simulation (array)
+alignMatrix: matrix of crystallographic alignments (array)
+packed: site codes and alignments packed into one array (array)
+
+OUTPUTS:
+
+lattice: empty lattice of one byte per site (array)
+packed: site codes and alignments packed into one array (array)
+matrix, alignMatrix: site codes and alignments of a packed array (arrays)
+"""
+
+import numpy
+
+# Type of every lattice in the simulation
+latticeType = numpy.uint8
+# Bits of a packed site holding the site code
+codeBits = 4
+
+# Empty lattice of the simulation square
+def newLattice(squareSize):
+    return numpy.zeros((squareSize, squareSize), dtype=latticeType)
+
+# Pack site codes and alignments into one byte per site
+def packLattice(matrix, alignMatrix):
+    return (matrix | (alignMatrix << codeBits)).astype(latticeType)
+
+# Split a packed array into site codes and alignments
+def unpackLattice(packed):
+    return (packed & ((1 << codeBits) - 1), packed >> codeBits)
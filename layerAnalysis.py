@@ -0,0 +1,195 @@
+"""
+layerAnalysis.py - analyses of the simulation after each layer (islands,
+roughness of the surface and geometry of the cluster), run by a worker thread
+on snapshots of the matrix so that the walkers keep walking while they run.
+
+After each layer DLACluster.py submits the matrix; the pipeline copies it
+(with the column tops of columnTops.py and the running sums of
+clusterGeometry.py) and queues the copy for the worker, which analyses the
+layers in order. Islands are counted with the IslandTracker of countIslands.py,
+so the pipeline also keeps the lowest row where oxide was deposited between
+two layers. The records of all layers are joined at the end of the run.
+
+With background = False the layers are analysed as they are submitted.
+The time spent counting islands is added to the statistics of the run.
+The worker queues the snapshot and record of every analysed layer, which
+dispatch passes to the progress callback (see runStats.py) and to the
+islandsCounted callbacks of the hooks (see simulationHooks.py) on the main
+thread, so the callbacks need no lock: at each submit for the layers done
+so far, and after waiting for the worker before the run reports it stopped,
+so that every layer is reported before the stop.
+
+For a checkpoint of the run (see checkpoint.py) the pipeline waits for the
+worker and gives the records so far and the state of the island tracker,
+which a pipeline of the resumed run takes over.
+
+INPUTS: LayerPipeline(squareSize, geometry, seedRadii, background, stats, progress, hooks)
+        LayerPipeline.deposit(y)
+        LayerPipeline.submit(matrix, tops)
+        LayerPipeline.dispatch(wait)
+        LayerPipeline.records()
+        LayerPipeline.state()
+        LayerPipeline.restore(state)
+
+squareSize: dimensions of simulation square (int)
+geometry: running sums over the cluster particles, read at each layer (dict)
+seedRadii: radius of the cluster grown from each seed, read at each layer (list)
+background: analyse the layers in a worker thread (bool)
+stats: statistics of the run, or None (RunStats)
+progress: called with the record of every layer, or None (function)
+hooks: callbacks on the events of the run, or None (HookRegistry)
+y: row of a deposited oxide particle (int)
+matrix: matrix representation of simulation, copied (array)
+tops: heights of the topmost sites in every column, copied (dict of arrays)
+wait: wait for the layers submitted so far before dispatching, if there are
+      callbacks (bool)
+state: records so far and state of the island tracker (dict)
+
+OUTPUTS:
+
+layers: layer number, mass, radius, radius of gyration and bounding box area
+        of the cluster, number of islands, mean height and roughness of the
+        surface after every layer (dict of arrays)
+"""
+
+import queue
+import threading
+import time
+import numpy
+import clusterGeometry
+from countIslands import IslandTracker
+
+# Names of the samples recorded for every layer
+layerNames = ['layer', 'mass', 'radius', 'gyration', 'area', 'islands', 'height', 'roughness']
+
+# Analyses of the layers of a run, in a worker thread or as they are submitted
+class LayerPipeline:
+
+    def __init__(self, squareSize, geometry, seedRadii, background=True, stats=None, progress=None, hooks=None):
+        self.geometry = geometry
+        self.stats = stats
+        self.progress = progress
+        self.hooks = hooks
+        self.seedRadii = seedRadii
+        # Seed particles are not part of the mass
+        self.seeds = geometry['count']
+        self.tracker = IslandTracker(squareSize)
+        self.squareSize = squareSize
+        # Lowest deposit row since the last layer (kept by the main thread)
+        self.lowestDeposit = squareSize
+        self.layers = {name: [] for name in layerNames}
+        self.error = None
+        # Snapshots and records of the analysed layers not yet passed to the callbacks
+        self.done = queue.Queue()
+        self.worker = None
+        if background:
+            self.queue = queue.Queue()
+            self.worker = threading.Thread(target=self.work, daemon=True)
+            self.worker.start()
+
+    # Oxide deposited in row y
+    def deposit(self, y):
+        self.lowestDeposit = min(self.lowestDeposit, y)
+
+    # Queue a snapshot of the simulation after a layer
+    def submit(self, matrix, tops):
+
+        snapshot = (matrix.copy(), tops['surface'].copy(), dict(self.geometry), max(self.seedRadii), self.lowestDeposit)
+        self.lowestDeposit = self.squareSize
+        if self.worker is not None:
+            self.queue.put(snapshot)
+        else:
+            self.done.put((snapshot[0], self.analyse(*snapshot)))
+        self.dispatch()
+
+    # Wait for the worker and return the records of every layer
+    def records(self):
+
+        if self.worker is not None:
+            # Empty snapshot stops the worker
+            self.queue.put(None)
+            self.worker.join()
+            self.worker = None
+        self.dispatch()
+        if self.error is not None:
+            raise self.error
+
+        return {name: numpy.array(values) for name, values in self.layers.items()}
+
+    # Wait until the snapshots submitted so far are analysed
+    def wait(self):
+
+        if self.worker is not None:
+            self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+    # Pass the records of the analysed layers to the progress callback and
+    # the hooks (on the calling thread), waiting for the layers submitted so
+    # far if asked
+    def dispatch(self, wait=False):
+
+        watching = self.hooks is not None and self.hooks.active
+        if wait and (self.progress is not None or watching):
+            self.wait()
+        while not self.done.empty():
+            matrix, record = self.done.get()
+            if self.progress is not None:
+                self.progress(dict(record, event='layer'))
+            if watching:
+                self.hooks.call('islandsCounted', matrix, record)
+
+    # Records so far and state of the island tracker, for a checkpoint
+    def state(self):
+
+        self.wait()
+
+        return {'layers': {name: list(values) for name, values in self.layers.items()},
+                'tracker': dict(vars(self.tracker)), 'lowestDeposit': self.lowestDeposit}
+
+    # Take over the records and the island tracker of a checkpoint
+    def restore(self, state):
+
+        self.wait()
+        self.layers = {name: list(values) for name, values in state['layers'].items()}
+        vars(self.tracker).update(state['tracker'])
+        self.lowestDeposit = state['lowestDeposit']
+
+    # Analyse snapshots until stopped
+    def work(self):
+
+        while True:
+            snapshot = self.queue.get()
+            if snapshot is None:
+                return
+            # After an error the remaining snapshots are skipped
+            if self.error is None:
+                try:
+                    self.done.put((snapshot[0], self.analyse(*snapshot)))
+                except Exception as error:
+                    self.error = error
+            self.queue.task_done()
+
+    # Record the analyses of one snapshot and return its record
+    def analyse(self, matrix, surface, geometry, radius, lowestDeposit):
+
+        # Count matrix 'islands' for measure of anastomosis
+        start = time.perf_counter()
+        if lowestDeposit < self.squareSize:
+            self.tracker.deposit(lowestDeposit)
+        islands = self.tracker.count(matrix)
+        if self.stats is not None:
+            self.stats.lap('islands', start)
+
+        # Mean height and roughness (interface width) of the surface
+        heights = surface[surface >= 0]
+        height = heights.mean() if len(heights) > 0 else 0.0
+        roughness = heights.std() if len(heights) > 0 else 0.0
+
+        record = {'layer': len(self.layers['layer']) + 1, 'mass': geometry['count'] - self.seeds, 'radius': radius,
+                  'gyration': clusterGeometry.gyrationRadius(geometry), 'area': clusterGeometry.clusterArea(geometry),
+                  'islands': islands, 'height': height, 'roughness': roughness}
+        for name in layerNames:
+            self.layers[name].append(record[name])
+
+        return record
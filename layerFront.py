@@ -0,0 +1,141 @@
+"""
+layerFront.py - active front of layer growth for surface normal deposition in
+addLayer.py. Only sites with an empty (gel) site in their Moore neighbourhood
+can grow, so instead of visiting every site of the KPZ matrix, surface normal
+deposition visits the sites of the front, a sorted array of the flat indices
+of these sites which is kept up to date for the rows changed by each layer.
+Growing sites are layer sites or metal oxide, so empty sites (the bulk of the
+square above the layers) are left out and the front holds about one site per
+column and interface: the cost of a layer is proportional to the front and
+to the band of rows it changes, not to the square.
+
+Growth of the front is a parallel update (as in the original cellular
+automaton): every site with an empty neighbour at offset k grows onto it with
+probability prob_k / mod, silica on the cluster taking precedence.
+
+The front also keeps the rows of the band of the last layer, which hold all
+of its silica solution, and a row above which no site of the KPZ matrix is
+filled, so that addLayer.py only looks for the tops of the columns near the
+last layer.
+
+INPUTS: newFront(KPZMatrix, matrix, squareSize)
+        exposedSites(KPZMatrix, matrix, squareSize, rowMin, rowMax)
+        updateFront(front, KPZMatrix, matrix, squareSize, rowMin, rowMax)
+        frontDeposition(KPZMatrix, matrix, squareSize, existingLayers, depMod, clusterMod, rng, front)
+        siteBand(sites, squareSize)
+
+KPZMatrix: matrix used in creation of layers (matrix)
+matrix: matrix representing simulation area (matrix)
+squareSize: dimensions of simulation area (int)
+rowMin, rowMax: range of rows (int)
+front: flat indices of the sites which can grow ('sites'), rows of the band
+       of the last layer ('solution') and row above which no site is filled
+       ('top') (dict)
+existingLayers: Number of layers in simulation (int)
+depMod: Modulating factor in surface-normal deposition (float)
+clusterMod: Modulating factor in on-cluster deposition (float)
+rng: random number generator of the run (Generator)
+sites: flat indices of sites of the square (array)
+
+OUTPUTS:
+
+front: sites which can grow and rows of the last layer (dict)
+exposed: sites of rows rowMin to rowMax - 1 which can grow (array)
+band: rows rowMin to rowMax - 1 and columns colMin to colMax - 1 holding the
+      sites filled by surface normal deposition, or the sites given, as
+      (rowMin, rowMax, colMin, colMax) (tuple)
+"""
+
+import numpy as np
+
+# Moore neighbourhood offsets (row, column), Von Neumann neighbours first
+mooreOffsets = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1)]
+# Probability of growth onto an empty neighbour at each offset (before depMod / clusterMod)
+mooreProbs = [0.9717]*4 + [0.54544]*4
+
+# Front of a whole square (every row may hold solution or filled sites)
+def newFront(KPZMatrix, matrix, squareSize):
+    return {'sites': np.flatnonzero(exposedSites(KPZMatrix, matrix, squareSize)), 'solution': (0, squareSize), 'top': squareSize}
+
+# Sites of rows rowMin to rowMax - 1 which are filled or metal oxide, with an empty Moore neighbour (periodic columns)
+def exposedSites(KPZMatrix, matrix, squareSize, rowMin=0, rowMax=None):
+
+    if rowMax is None:
+        rowMax = squareSize
+    # Rows rowMin - 1 to rowMax, rows outside the square are not empty
+    empty = np.zeros((rowMax - rowMin + 2, squareSize), dtype=bool)
+    low, high = max(rowMin - 1, 0), min(rowMax + 1, squareSize)
+    empty[low - rowMin + 1:high - rowMin + 1] = KPZMatrix[low:high] == 0
+    rows = np.arange(rowMin - 1, rowMax + 1)
+    exposed = np.zeros((rowMax - rowMin, squareSize), dtype=bool)
+    for offset in mooreOffsets:
+        exposed |= np.roll(empty, -offset[1], axis=1)[1 + offset[0]:len(rows) - 1 + offset[0]]
+    # Empty sites do not grow (unless metal oxide sits on them)
+    exposed &= ~empty[1:-1] | (matrix[rowMin:rowMax] == 1)
+
+    return exposed
+
+# Update the front around rows rowMin to rowMax - 1 changed in KPZMatrix
+def updateFront(front, KPZMatrix, matrix, squareSize, rowMin, rowMax):
+
+    rowMin = max(rowMin - 1, 0)
+    rowMax = min(rowMax + 1, squareSize)
+    if rowMin < rowMax:
+        # Sites of these rows are replaced, the front stays sorted
+        sites = front['sites']
+        first, last = np.searchsorted(sites, (rowMin*squareSize, rowMax*squareSize))
+        exposed = np.flatnonzero(exposedSites(KPZMatrix, matrix, squareSize, rowMin, rowMax)) + rowMin*squareSize
+        front['sites'] = np.concatenate((sites[:first], exposed, sites[last:]))
+
+    return front
+
+# Surface normal deposition from the sites of the front, returning the band of the sites filled
+def frontDeposition(KPZMatrix, matrix, squareSize, existingLayers, depMod, clusterMod, rng, front):
+
+    # Layer which grows (alternates between layers)
+    layerCode = 3 if existingLayers%2 == 0 else 2
+    # Sites of the front in rows 1 to squareSize - 2
+    sites = front['sites']
+    sites = sites[(sites >= squareSize) & (sites < (squareSize - 1)*squareSize)]
+    row, col = np.divmod(sites, squareSize)
+    # Moore neighbours of each site (columns are periodic)
+    neighbours = np.array([((row + offset[0])%squareSize)*squareSize + (col + offset[1])%squareSize for offset in mooreOffsets])
+    neighbourCodes = KPZMatrix.ravel()[neighbours]
+
+    # Sites of the layer grow silica solution
+    layer = KPZMatrix.ravel()[sites] == layerCode
+    # Cluster sites next to the layer or to silica on the cluster grow silica on the cluster
+    touching = ((neighbourCodes == layerCode) | (neighbourCodes == 6)).any(axis=0)
+    cluster = ~layer & (matrix.ravel()[sites] == 1) & touching
+
+    # Growth events (empty neighbour, probability, code grown)
+    targets = []
+    probs = []
+    codes = []
+    for k in range(len(mooreOffsets)):
+        empty = neighbourCodes[k] == 0
+        for source, mod, code in ((layer, depMod, 4), (cluster, clusterMod, 6)):
+            candidate = empty & source
+            targets.append(neighbours[k][candidate])
+            probs.append(np.full(np.count_nonzero(candidate), mooreProbs[k]/mod))
+            codes.append(np.full(np.count_nonzero(candidate), code, dtype=KPZMatrix.dtype))
+    targets = np.concatenate(targets)
+    probs = np.concatenate(probs)
+    codes = np.concatenate(codes)
+
+    # Parallel update, silica on the cluster written over solution
+    grow = rng.random(len(targets)) < probs
+    for code in (4, 6):
+        KPZMatrix.ravel()[targets[grow & (codes == code)]] = code
+    filled = targets[grow]
+
+    return siteBand(filled, squareSize)
+
+# Smallest band of rows and columns holding the sites
+def siteBand(sites, squareSize):
+
+    if len(sites) == 0:
+        return (0, 0, 0, 0)
+    row, col = np.divmod(sites, squareSize)
+
+    return (row.min(), row.max() + 1, col.min(), col.max() + 1)
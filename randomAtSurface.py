@@ -3,43 +3,148 @@ randomAtSurface.py - generates a random position at the top
 of the simulation area for a metal oxide particle to begin a
 random walk in DLACluster.py.
 
-INPUTS: randomAtSurface(squareSize)
+INPUTS: randomAtSurface(squareSize, count, rng)
 
 squareSize: dimensions of simulation square (int)
+count: number of walkers to release at once, or None for one walker (int)
+rng: random number generator of the run (Generator)
 
 OUTPUTS:
 
-location: starting position of random walker (list)
+location: starting position of random walker (list), or arrays of x and y
+coordinates of count walkers (tuple of arrays)
 
+Also contains the launch shell used with launch='shell' in DLACluster.py.
+The cluster grows up from the substrate under horizontal silica layers, so
+the shell enclosing it is the line launchHeight just above the highest
+column top of columnTops.py - only gel and solution lie on and above this
+line, never the cluster or solid silica. Walkers arriving from far above hit this line uniformly, so they
+are released uniformly along it. Walkers that wander above the kill height
+are re-injected onto the line where a walker from that point would first
+hit it: for a line at distance d below the walker this first-passage
+distribution is a Cauchy distribution of width d about the walker's x.
+Walkers that would first hit the line outside the square are lost at the
+sides, as they would be without re-injection.
+
+INPUTS: randomOnShell(squareSize, launchHeight, matrix, count, rng)
+        reinjectOnShell(x, y, squareSize, launchHeight, matrix, rng)
+
+launchHeight: height (row) of the launch line (int)
+matrix: matrix representation of simulation (matrix)
+x, y: positions of walkers above the kill height (arrays)
+
+OUTPUTS:
+
+x, y: positions of walkers on the launch line (arrays)
+valid: walker did not land in solid silica or near the edge (array)
 """
 
-import random
+import math
+import numpy
+from checkAround import solidCodes
+from rngStreams import defaultGenerator
+
+def randomAtSurface(squareSize, count=None, rng=None):
 
-def randomAtSurface(squareSize):
+    if rng is None:
+        rng = defaultGenerator()
+
+    # Release many walkers at once for the batched engine
+    if count is not None:
+        return randomAtSurfaceBatch(squareSize, count, rng)
     
-    marker = random.uniform(0, 1)
+    marker = rng.random()
     # Add 5 to parameters to avoid edges of square
     
     if marker < float(4/6):
     
         # Release at top of simulation area
-        x = random.randint(5, squareSize - 6) # x coordinate
+        x = 5 + int(rng.random()*(squareSize - 10)) # x coordinate
         y = (squareSize - 5) # y coordinate 
         location = [x, y] 
     
     elif marker > float(5/6):
         # Release at left of simulation area
         x = 5
-        y = random.randint(5, squareSize - 6)       
+        y = 5 + int(rng.random()*(squareSize - 10))
         location = [x, y] 
 
     elif marker > float (4/6) and marker < float(5/6):
         # Release at right of simulation area
         x = squareSize - 6
-        y = random.randint(5, squareSize - 6)       
+        y = 5 + int(rng.random()*(squareSize - 10))
         location = [x, y]
         
     # Position of released particle 
     return (location)
 
-    
+# Vectorised release of count walkers with the same distribution as above
+def randomAtSurfaceBatch(squareSize, count, rng):
+
+    marker = rng.random(count)
+    # Random coordinate along the chosen side
+    along = rng.integers(5, squareSize - 5, count)
+
+    # Release at top of simulation area
+    x = along.copy()
+    y = numpy.full(count, squareSize - 5)
+    # Release at left of simulation area
+    left = marker > 5/6
+    x[left] = 5
+    y[left] = along[left]
+    # Release at right of simulation area
+    right = (marker > 4/6) & (marker < 5/6)
+    x[right] = squareSize - 6
+    y[right] = along[right]
+
+    # Positions of released particles
+    return (x, y)
+
+# Height above which walkers are re-injected onto the launch line
+def killHeight(squareSize, launchHeight):
+    # Keep the kill line clear of the top of the square
+    return min(2*launchHeight, squareSize - 7)
+
+# Release count walkers uniformly along the launch line
+def randomOnShell(squareSize, launchHeight, matrix, count, rng):
+
+    x = numpy.zeros(count, dtype=int)
+    y = numpy.full(count, launchHeight)
+    pending = numpy.arange(count)
+    # Resample walkers landing in solid silica
+    for attempt in range(10):
+        x[pending] = rng.integers(2, squareSize - 1, len(pending))
+        pending = pending[~shellValid(x[pending], y[pending], squareSize, matrix)]
+        if len(pending) == 0:
+            break
+
+    # Launch line buried in the layers - release at the surface of the square
+    if len(pending) > 0:
+        x[pending], y[pending] = randomAtSurface(squareSize, len(pending), rng)
+
+    return (x, y)
+
+# Re-inject walkers above the kill height onto the launch line
+def reinjectOnShell(x, y, squareSize, launchHeight, matrix, rng):
+
+    # First passage position on the launch line (Cauchy)
+    u = rng.random(len(x))
+    x = numpy.rint(x + (y - launchHeight)*numpy.tan(math.pi*(u - 0.5)))
+    # Clip far tails before converting (walkers there are lost anyway)
+    x = numpy.clip(x, -1, squareSize).astype(int)
+    y = numpy.full(len(x), launchHeight)
+
+    return (x, y, shellValid(x, y, squareSize, matrix))
+
+# Site is away from the edge (as in checkAround) and not solid silica
+def shellValid(x, y, squareSize, matrix):
+
+    valid = awayFromEdge(x, y, squareSize)
+    valid[valid] = ~numpy.isin(matrix[y[valid], x[valid]], solidCodes)
+
+    return valid
+
+# Site is away from the edge of the square (as in checkAround)
+def awayFromEdge(x, y, squareSize):
+    return ((y + 1) <= squareSize - 5) & ((y - 1) >= 1) & \
+           ((x + 1) <= squareSize - 1) & ((x - 1) >= 1)
@@ -0,0 +1,74 @@
+"""
+rngStreams.py - random number streams for the simulation. Every module draws
+from a NumPy Generator passed to it explicitly, so a run is reproduced
+exactly by its seed. Independent streams for the replicas of a sweep are
+spawned from one root seed, so any single replica can be rerun on its own
+from the root seed and its index.
+
+Scalar draws in the walker loop are served from blocks of pre-drawn uniform
+numbers by RandomBlock, which can be passed anywhere a Generator is
+expected.
+
+INPUTS: makeGenerator(seed)
+        replicaSeeds(rootSeed, count)
+        replicaSeed(rootSeed, index)
+
+seed: seed of the run - None (fresh entropy), int, SeedSequence or Generator
+rootSeed: seed from which the replicas of a sweep are spawned (int)
+count: number of replicas (int)
+index: index of one replica (int)
+
+OUTPUTS:
+
+rng: random number generator (Generator)
+seeds: seeds of the replicas (list of SeedSequence)
+"""
+
+import numpy
+
+# Number of uniform numbers drawn at once by RandomBlock
+blockSize = 4096
+
+# Generator used when a module is called without one
+sharedGenerator = None
+
+# Build the generator of a run from its seed
+def makeGenerator(seed=None):
+    return numpy.random.default_rng(seed)
+
+# Generator for modules called without an explicit one
+def defaultGenerator():
+    global sharedGenerator
+    if sharedGenerator is None:
+        sharedGenerator = makeGenerator()
+    return sharedGenerator
+
+# Independent seeds for count replicas of a sweep
+def replicaSeeds(rootSeed, count):
+    return numpy.random.SeedSequence(rootSeed).spawn(count)
+
+# Seed of replica index alone (same as replicaSeeds(rootSeed, count)[index])
+def replicaSeed(rootSeed, index):
+    return numpy.random.SeedSequence(rootSeed, spawn_key=(index,))
+
+# Generator whose scalar uniform draws come from pre-drawn blocks
+class RandomBlock:
+
+    def __init__(self, generator):
+        self.generator = generator
+        self.block = []
+        self.position = 0
+
+    # Uniform number(s) in [0, 1) - scalars are taken from the current block
+    def random(self, size=None):
+        if size is not None:
+            return self.generator.random(size)
+        if self.position == len(self.block):
+            self.block = self.generator.random(blockSize).tolist()
+            self.position = 0
+        self.position += 1
+        return self.block[self.position - 1]
+
+    # Any other draw goes straight to the generator
+    def __getattr__(self, name):
+        return getattr(self.generator, name)
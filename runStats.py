@@ -0,0 +1,142 @@
+"""
+runStats.py - instrumentation of DLACluster runs: where the time went and
+what became of the walkers, collected as the run goes and returned with its
+results, and the progress of a run passed to a callback.
+
+Time is summed per phase of the run (see phaseNames) from pairs of
+time.perf_counter() calls around the phase, so collecting the statistics
+costs a few calls per walker. The island count runs in the worker thread
+of layerAnalysis.py with analysis = 'background', so its time overlaps the
+time of the other phases.
+
+Every walker ends with one fate (see fateNames, counted once per walker,
+except re-injections onto the launch line and lost sites, counted once per
+event). Walkers which touch the cluster deposit (aligned with their
+neighbour, or not and let through by alignProb), are rejected by alignProb
+or are blocked (their site is not silica solution or is near the top of the
+square). With the batched engine a walker can also lose its site to a
+walker released before it, and then walks on, or be buried by a layer (its
+site changed by the layer) and taken out of the pool.
+With stepHistogram (see DLACluster.py) the number of unit steps of every
+walker which ended is counted in bins of powers of two: bin k holds walkers
+of 2**(k - 1) to 2**k - 1 steps.
+
+The progress of a run is passed to a callback as a record (dict) with an
+'event' - 'snapshot' (every 500 walkers), 'layer' (islands counted after a
+layer) or 'stopped' (with the 'reason' the run stopped, after the 'layer'
+records of every layer added) - and the counters of the run. The callback
+is always called on the thread running DLACluster.py (see layerAnalysis.py). printProgress prints the progress lines DLACluster.py printed before.
+
+INPUTS: RunStats(countSteps)
+        RunStats.lap(phase, start)
+        RunStats.walker(steps)
+        RunStats.walkerSteps(steps)
+        RunStats.fate(name, count)
+        RunStats.acceptance()
+        RunStats.stepHistogram()
+        RunStats.summary()
+        printProgress(record)
+
+countSteps: steps of the walkers are counted for the histogram (bool)
+phase: name of a phase of the run, in phaseNames (str)
+start: time.perf_counter() at the start of the phase (float)
+steps: number of unit steps of a walker which ended (int, or array for the
+       walkers of a batch)
+name: name of a fate of walkers, in fateNames (str)
+count: number of walkers with that fate (int)
+record: progress of the run (dict)
+
+OUTPUTS:
+
+now: time.perf_counter() at the end of the phase (float)
+acceptance: fraction of the walkers touching the cluster which deposited,
+            overall and among walkers not aligned with their neighbour (dict)
+bins, counts: lowest number of steps of every bin and number of walkers in
+              it, up to the last bin in use (arrays)
+summary: times, fates, acceptance and step histogram of the run (dict)
+"""
+
+import time
+import numpy
+
+# Phases of a run timed by RunStats
+phaseNames = ['walk', 'layer', 'islands', 'snapshot', 'history', 'checkpoint', 'output']
+# Fates of walkers counted by RunStats
+fateNames = ['aligned', 'unaligned', 'rejected', 'blocked', 'lost', 'nearEdge', 'inSolid', 'buried', 'reinjected']
+# Bins of the steps histogram (powers of two)
+stepBins = 64
+
+# Time per phase, walker fates and steps per walker of a run
+class RunStats:
+
+    def __init__(self, countSteps=False):
+        self.countSteps = countSteps
+        self.phases = dict.fromkeys(phaseNames, 0.0)
+        self.fates = dict.fromkeys(fateNames, 0)
+        self.steps = [0]*stepBins
+        # Wall-clock time of the whole run
+        self.elapsed = 0.0
+
+    # Add the time since start to a phase
+    def lap(self, phase, start):
+
+        now = time.perf_counter()
+        self.phases[phase] += now - start
+
+        return now
+
+    # A walker ended after a number of steps
+    def walker(self, steps):
+        self.steps[steps.bit_length()] += 1
+
+    # Walkers of a batch ended after numbers of steps
+    def walkerSteps(self, steps):
+
+        # Binary exponent of n is the bit length of n (0 for no steps)
+        counts = numpy.bincount(numpy.frexp(numpy.asarray(steps, dtype=float))[1], minlength=stepBins)
+        for k in numpy.flatnonzero(counts):
+            self.steps[k] += int(counts[k])
+
+    # Walkers met a fate
+    def fate(self, name, count=1):
+        self.fates[name] += count
+
+    # Fraction of the walkers touching the cluster which deposited
+    def acceptance(self):
+
+        deposited = self.fates['aligned'] + self.fates['unaligned']
+        tried = deposited + self.fates['rejected'] + self.fates['blocked'] + self.fates['lost']
+        unaligned = self.fates['unaligned'] + self.fates['rejected']
+
+        return {'overall': deposited/tried if tried > 0 else 0.0,
+                'unaligned': self.fates['unaligned']/unaligned if unaligned > 0 else 0.0}
+
+    # Steps histogram up to the last bin in use
+    def stepHistogram(self):
+
+        used = max([k + 1 for k in range(stepBins) if self.steps[k] > 0], default=0)
+        bins = numpy.array([0] + [2**(k - 1) for k in range(1, used)], dtype=numpy.int64)[:used]
+
+        return (bins, numpy.array(self.steps[:used], dtype=numpy.int64))
+
+    # Everything collected, as plain values
+    def summary(self):
+
+        bins, counts = self.stepHistogram()
+
+        return {'elapsed': self.elapsed, 'phases': dict(self.phases), 'fates': dict(self.fates),
+                'acceptance': self.acceptance(), 'stepBins': bins.tolist(), 'stepCounts': counts.tolist()}
+
+# Print the progress lines of a run
+def printProgress(record):
+
+    if record['event'] == 'layer':
+        print("Layer added, number of islands = ", str(record['islands']))
+    elif record['event'] == 'stopped':
+        if record['reason'] == 'walkerLimit':
+            print("CAUTION: had to break the cycle, taking too many iterations")
+        print("Walkers added to cluster: ", record['mass'])
+        if record['reason'] == 'surfaceAtEdge':
+            print("Finished, surface reached edge or encloses the cluster entirely ")
+        else:
+            print("Cluster reached edge of square")
@@ -19,12 +19,17 @@ OUTPUTS:
 
 mass: number of particles added to metal oxide cluster (int)
 clusterRadius: distance from seed origin to furthest particle in cluster (float)
+clusterArea: area of the bounding box of the cluster (int)
 matrix: final matrix representation of the simulation (array)
+islands: number of islands in the simulation (int)
+history: mass, radius, radius of gyration and bounding box after every deposition (dict of arrays)
+layers: islands, surface roughness and cluster geometry after every layer (dict of arrays)
+stats: time per phase, walker fates, acceptance of depositions and steps per walker (RunStats)
 """
 
 # Import main DLACluster script
 from DLAcluster import DLAcluster 
 
 # Import mass, radius of cluster and matrix representing simulation
-mass, clusterRadius, clusterArea, matrix, islands = DLAcluster(200, True, 1000, 50, 0, 1, 1, 1, 9)
+mass, clusterRadius, clusterArea, matrix, islands, history, layers, stats = DLAcluster(200, True, 1000, 50, 0, 1, 1, 1, 9)
 
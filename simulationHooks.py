@@ -0,0 +1,67 @@
+"""
+simulationHooks.py - registry of callbacks on the events of a DLACluster
+run, so that measurements can be added to a run without changing
+DLACluster.py.
+
+Callbacks are registered on the name of an event (see hookNames) and are
+called in the order they were added, all on the thread running
+DLACluster.py. They get references to the state of
+the run (nothing is copied, so they must not change it): the state dict of
+DLACluster.py holds the matrix, KPZMatrix, alignMatrix, seedMatrix, the
+running sums of clusterGeometry.py (geometry, seedRadii, history), the
+column tops, the distance field (or None) and the statistics of the run.
+
+launched(state, walker, x, y): a walker was released at (x, y)
+deposited(state, walker, x, y, mass): a walker deposited at (x, y) (with the
+                                      batched engine, after every deposition
+                                      of its step)
+layerAdded(state, layers, mass): a layer was added to the simulation
+islandsCounted(matrix, record): the islands of a layer were counted, on the
+                                snapshot of layerAnalysis.py (passed on by
+                                the main thread once counted, at the latest
+                                before the run stops)
+finished(state, results): the run finished with results (tuple, see
+                          DLACluster.py)
+
+The registry keeps a flag for any callbacks at all, which DLACluster.py
+checks once per walker (once per step of the batched engine), so a run
+without callbacks does not look them up.
+
+INPUTS: HookRegistry()
+        HookRegistry.add(name, callback)
+        HookRegistry.remove(name, callback)
+        HookRegistry.call(name, *arguments)
+
+name: name of an event, in hookNames (str)
+callback: function called on the event (function)
+arguments: arguments of the callbacks of the event
+
+OUTPUTS:
+
+active: any callbacks registered (bool)
+"""
+
+# Events of a run with callbacks
+hookNames = ['launched', 'deposited', 'layerAdded', 'islandsCounted', 'finished']
+
+# Callbacks on the events of a run
+class HookRegistry:
+
+    def __init__(self):
+        self.hooks = {name: [] for name in hookNames}
+        self.active = False
+
+    # Call callback on every event of that name
+    def add(self, name, callback):
+        self.hooks[name].append(callback)
+        self.active = True
+
+    # Stop calling callback on the events of that name
+    def remove(self, name, callback):
+        self.hooks[name].remove(callback)
+        self.active = any(self.hooks.values())
+
+    # Call the callbacks of an event
+    def call(self, name, *arguments):
+        for callback in self.hooks[name]:
+            callback(*arguments)
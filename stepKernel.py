@@ -0,0 +1,131 @@
+"""
+stepKernel.py - fused stepping kernel for single walkers in DLACluster.py.
+Replaces one call to checkAround per step with one call per walk: the
+walker takes unit steps (or distance-field jumps) until it touches the
+cluster, reaches the edge of the square, tries to enter solid silica or
+wanders above the kill height of the launch line, and only then returns.
+
+Positions are flat indices y*squareSize + x into the matrix, so the Von
+Neumann neighbours and the four steps are fixed offsets from precomputed
+tables. Steps are drawn from a buffer of pre-generated random directions
+(DirectionBuffer). The orientation of the neighbouring cluster particle is
+returned as an integer code indexing checkAround.orientationNames, with the
+same precedence as checkAround (left, then right, up and down).
+
+INPUTS: walkWalker(position, cells, edge, squareSize, directions, rng, fieldCells, killStart)
+
+position: flat index of the walker (int)
+cells: flat view of the matrix (memoryview)
+edge: sites near the edge of the square, as in checkAround (bytes)
+squareSize: dimensions of simulation square (int)
+directions: buffer of random step directions (DirectionBuffer)
+rng: random number generator of the run, for jumps (Generator)
+fieldCells: flat view of the distance field, or None for unit steps only (memoryview)
+killStart: first flat index above the kill height, or None (int)
+
+OUTPUTS:
+
+position: flat index of the walker when it stopped (int)
+event: why the walker stopped - foundFriend, nearEdge, inSolid or aboveKill (int)
+orientation: code of the neighbouring cluster particle, or -1 (int)
+steps: number of unit steps taken (int)
+"""
+
+import numpy
+from checkAround import solidCodes
+from distanceField import jumpMargin
+
+# Events ending a call to walkWalker
+foundFriend = 1
+nearEdge = 2
+inSolid = 3
+aboveKill = 4
+
+# Number of random directions drawn at once
+directionBlock = 65536
+
+# Buffer of random step directions (0: left, 1: right, 2: down, 3: up)
+class DirectionBuffer:
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.refill()
+
+    def refill(self):
+        self.data = self.rng.integers(0, 4, directionBlock, dtype=numpy.uint8).tobytes()
+        self.position = 0
+
+# Sites near the edge of the square, as in checkAround
+def edgeMask(squareSize):
+    rows = numpy.arange(squareSize)
+    nearRow = ((rows + 1) > squareSize - 5) | ((rows - 1) < 1)
+    nearCol = ((rows + 1) > squareSize - 1) | ((rows - 1) < 1)
+    return (nearRow[:, None] | nearCol[None, :]).astype(numpy.uint8).tobytes()
+
+# Walk a single walker until it stops
+def walkWalker(position, cells, edge, squareSize, directions, rng, fieldCells=None, killStart=None):
+
+    # Flat offsets of a random step, in the order used by checkAround
+    stepOffsets = (-1, 1, squareSize, -squareSize)
+    solid = frozenset(solidCodes)
+    if killStart is None:
+        killStart = squareSize*squareSize
+    buffer = directions.data
+    index = directions.position
+    steps = 0
+
+    while True:
+        # Near the edge of the square
+        if edge[position]:
+            event = nearEdge
+            orientation = -1
+            break
+        # Neighbouring particle in the cluster (left, right, up, down)
+        if cells[position - 1] == 1:
+            event = foundFriend
+            orientation = 3
+            break
+        if cells[position + 1] == 1:
+            event = foundFriend
+            orientation = 2
+            break
+        if cells[position - squareSize] == 1:
+            event = foundFriend
+            orientation = 1
+            break
+        if cells[position + squareSize] == 1:
+            event = foundFriend
+            orientation = 0
+            break
+
+        if fieldCells is not None and fieldCells[position] > jumpMargin:
+            # Far from any obstacle - jump ahead (see distanceField.py)
+            jump = fieldCells[position] - 1
+            diagonalU = int(rng.binomial(jump, 0.5))
+            diagonalV = int(rng.binomial(jump, 0.5))
+            position += (diagonalU + diagonalV - jump) + (diagonalU - diagonalV)*squareSize
+            steps += jump
+        else:
+            # Random unit step
+            if index == len(buffer):
+                directions.refill()
+                buffer = directions.data
+                index = 0
+            newPosition = position + stepOffsets[buffer[index]]
+            index += 1
+            steps += 1
+            # Forbid walking through solid silica
+            if cells[newPosition] in solid:
+                event = inSolid
+                orientation = -1
+                break
+            position = newPosition
+
+        # Wandered above the kill height of the launch line
+        if position >= killStart:
+            event = aboveKill
+            orientation = -1
+            break
+
+    directions.position = index
+    return (position, event, orientation, steps)
@@ -0,0 +1,32 @@
+"""
+test_layerAnalysis.py - checks of the pipeline of layer analyses (run with pytest).
+"""
+
+import threading
+import columnTops
+from clusterGeometry import newGeometry
+from latticeState import newLattice
+from layerAnalysis import LayerPipeline
+from simulationHooks import HookRegistry
+
+# Records of layers analysed by the worker reach the progress callback and the hooks on the main thread, in order
+def test_callbacksOnMainThread():
+
+    squareSize = 40
+    matrix = newLattice(squareSize)
+    matrix[1, squareSize//2] = 1
+    calls = []
+    progress = lambda record: calls.append((threading.current_thread(), record['layer']))
+    hooks = HookRegistry()
+    hooks.add('islandsCounted', lambda snapshot, record: calls.append((threading.current_thread(), -record['layer'])))
+    pipeline = LayerPipeline(squareSize, newGeometry([squareSize//2], [1]), [0], True, None, progress, hooks)
+    for layer in range(5):
+        matrix[layer + 2, :] = 4
+        pipeline.submit(matrix, columnTops.columnTops(matrix, squareSize))
+
+    # Every layer is reported once waited for
+    pipeline.dispatch(wait=True)
+    assert [layer for thread, layer in calls] == [1, -1, 2, -2, 3, -3, 4, -4, 5, -5]
+    assert all(thread is threading.main_thread() for thread, layer in calls)
+    assert len(pipeline.records()['layer']) == 5
+    assert len(calls) == 10
@@ -0,0 +1,41 @@
+"""
+test_randomAtSurface.py - checks of the launch shell (run with pytest).
+"""
+
+import numpy
+import columnTops
+from checkAround import solidCodes
+from DLAcluster import simulationLayer
+from latticeState import newLattice
+from layerFront import newFront
+from randomAtSurface import reinjectOnShell, killHeight, awayFromEdge
+from rngStreams import makeGenerator
+
+# Walkers re-injected onto the launch line land in the solution above the layers
+def test_reinjectedInSolution():
+
+    squareSize = 60
+    launchGap = 5
+    rng = makeGenerator(2)
+    matrix = newLattice(squareSize)
+    matrix[1, squareSize//2] = 1
+    KPZMatrix = newLattice(squareSize)
+    front = newFront(KPZMatrix, matrix, squareSize)
+    tops = columnTops.columnTops(matrix, squareSize)
+    existingLayers = 0
+    for layer in range(4):
+        KPZMatrix, existingLayers = simulationLayer(KPZMatrix, matrix, 5*squareSize, squareSize, existingLayers, 0.0, 1, 1, rng, tops, front=front)[:2]
+
+        # Line above the cluster alone is buried in solid silica once a layer has set
+        assert (layer == 0) or numpy.isin(matrix[1 + launchGap], solidCodes).any()
+        launchHeight = min(columnTops.coverTop(tops) + launchGap, squareSize - 6)
+        assert not numpy.isin(matrix[launchHeight:], solidCodes + (1,)).any()
+
+        # Walkers everywhere above the kill height
+        killLine = killHeight(squareSize, launchHeight)
+        y, x = numpy.mgrid[killLine + 1:squareSize - 5, 2:squareSize - 2]
+        x, y, valid = reinjectOnShell(x.ravel(), y.ravel(), squareSize, launchHeight, matrix, rng)
+        # Only walkers lost at the sides are not valid, the others are in solution
+        assert numpy.array_equal(valid, awayFromEdge(x, y, squareSize))
+        assert valid.any()
+        assert numpy.all(matrix[y[valid], x[valid]] == 4)
@@ -0,0 +1,43 @@
+"""
+test_walkerEngine.py - checks of the batched walker engine (run with pytest).
+"""
+
+import numpy
+import columnTops
+from DLAcluster import simulationLayer
+from latticeState import newLattice
+from layerFront import newFront
+from rngStreams import makeGenerator
+from walkerEngine import poolSites, dropBuried
+
+# Walkers whose sites a layer changes do not stay in the pool
+def test_walkersInNewLayerDropped():
+
+    squareSize = 60
+    rng = makeGenerator(1)
+    matrix = newLattice(squareSize)
+    matrix[0, :] = 3
+    matrix[1, squareSize//2] = 1
+    KPZMatrix = newLattice(squareSize)
+    front = newFront(KPZMatrix, matrix, squareSize)
+    tops = columnTops.columnTops(matrix, squareSize)
+    KPZMatrix, existingLayers = simulationLayer(KPZMatrix, matrix, 5*squareSize, squareSize, 0, 0.0, 1, 1, rng, tops, front=front)[:2]
+
+    # A walker on every site away from the edge
+    y, x = numpy.mgrid[2:squareSize - 6, 2:squareSize - 2]
+    walkers = {'x': x.ravel(), 'y': y.ravel(), 'index': numpy.arange(x.size), 'steps': numpy.zeros(x.size, dtype=int)}
+    before = matrix.copy()
+    sites = poolSites(walkers, matrix)
+    simulationLayer(KPZMatrix, matrix, 5*squareSize, squareSize, existingLayers, 0.0, 1, 1, rng, tops, front=front)
+    walkers = dropBuried(walkers, sites, matrix)
+
+    # Sites filled by the new layer and sites turned into solid silica held walkers
+    newLayer = (before == 0) & (matrix == 4)
+    buried = (before == 4) & numpy.isin(matrix, (2, 3))
+    assert newLayer[2:squareSize - 6, 2:squareSize - 2].any()
+    assert buried[2:squareSize - 6, 2:squareSize - 2].any()
+    # None of them is left, every other walker is
+    changed = matrix != before
+    assert not changed[walkers['y'], walkers['x']].any()
+    assert len(walkers['x']) == numpy.count_nonzero(~changed[2:squareSize - 6, 2:squareSize - 2])
+    assert len(walkers['index']) == len(walkers['steps']) == len(walkers['x'])
@@ -0,0 +1,235 @@
+"""
+walkerEngine.py - batched random walker engine for DLACluster.py. Instead of
+releasing one walker at a time, a pool of walkers is held as NumPy arrays and
+every walker in the pool is advanced by one lattice step per call, with the
+same edge, neighbour, sticking and solid silica rules as checkAround.py and
+DLACluster.py.
+
+Deposition conflicts are resolved deterministically in order of release:
+if two walkers try to stick to the same site, the walker released first
+deposits and the others stay in the pool, on the new particle, and step off
+it before they can stick. At most 'quota' particles are deposited per call,
+so that layers are still added every 'layerStep' particles; walkers which
+find the cluster after the quota is used up wait for the next call. Walkers
+never step onto the cluster (including particles deposited earlier in the
+same call): such a step is refused and the walker stays where it is. The
+distance field is lowered around the particles deposited in a call before
+any walker jumps, so jumps never pass a new particle. Walkers whose sites a
+layer changes (buried in solid silica, or inside the new layer) are taken
+out of the pool after the layer, as no walker of the serial engine is
+walking while a layer is added.
+
+With walkerCount given, the pool also keeps the index (in order of release)
+and the number of unit steps of every walker, and the deposits are described
+for the event log (see eventLog.py). With stats given, the fates of the
+walkers which end are counted (and their steps, with walkerCount and
+stats.countSteps, see runStats.py). With launched given, it is called with
+the index (with walkerCount) and position of every walker released.
+Walkers already in the pool when walkers are first kept track of get index 0
+(walkers are numbered from 1).
+
+INPUTS: advanceWalkers(walkers, matrix, alignMatrix, squareSize, alignProb, batchSize, quota, rng, launchHeight, field, walkerCount, stats, launched)
+        poolSites(walkers, matrix)
+        dropBuried(walkers, sites, matrix, stats)
+
+walkers: positions of walkers in the pool, or None for an empty pool (dict)
+matrix: matrix representation of simulation (matrix)
+alignMatrix: matrix of crystallographic alignments (matrix)
+squareSize: dimensions of simulation square (int)
+alignProb: probability of deposition for non-aligned particles (float)
+batchSize: number of walkers held in the pool (int)
+quota: maximum number of particles deposited in this step (int)
+rng: random number generator of the run (Generator)
+launchHeight: height of the launch line (see randomAtSurface.py), or None
+              to release walkers at the surface of the square (int)
+field: distance field for walkers to jump ahead (see distanceField.py),
+       updated for the particles deposited, or None for unit steps only (array)
+walkerCount: number of walkers released before this step, or None not to
+             keep track of walkers (int)
+stats: statistics of the run, or None (RunStats)
+launched: called as launched(walker, x, y) for every walker released, or
+          None (function)
+sites: codes of the sites of the walkers in the pool before a layer (array)
+
+OUTPUTS:
+
+walkers: positions of walkers still walking (dict)
+released: number of walkers released into the pool (int)
+depositY: y coordinates of deposited particles (array)
+depositX: x coordinates of deposited particles (array)
+deposits: walker index, alignment, orientation and steps of every deposited
+          particle, or None without walkerCount (dict of arrays)
+sites: codes of the sites of the walkers in the pool (array)
+"""
+
+import numpy
+from checkAround import neighbourOffsets, alignedCells, solidCodes
+from distanceField import jumpWalker, jumpMargin, depositField
+from randomAtSurface import randomAtSurface, randomOnShell, reinjectOnShell, killHeight, awayFromEdge
+
+# Offsets (dy, dx) of a random step, in the order used by checkAround
+stepOffsets = numpy.array([(0, -1), (0, 1), (1, 0), (-1, 0)])
+
+# Advance every walker in the pool by one step
+def advanceWalkers(walkers, matrix, alignMatrix, squareSize, alignProb, batchSize, quota, rng, launchHeight=None, field=None, walkerCount=None, stats=None, launched=None):
+
+    track = walkerCount is not None
+    if walkers is None:
+        walkers = {'x': numpy.zeros(0, dtype=int), 'y': numpy.zeros(0, dtype=int)}
+    if track and 'index' not in walkers:
+        walkers['index'] = numpy.zeros(len(walkers['x']), dtype=int)
+        walkers['steps'] = numpy.zeros(len(walkers['x']), dtype=int)
+
+    # Top up the pool with new walkers (appended, so pool stays in release order)
+    released = batchSize - len(walkers['x'])
+    if launchHeight is None:
+        newX, newY = randomAtSurface(squareSize, released, rng)
+    else:
+        newX, newY = randomOnShell(squareSize, launchHeight, matrix, released, rng)
+    x = numpy.concatenate((walkers['x'], newX))
+    y = numpy.concatenate((walkers['y'], newY))
+    if track:
+        index = numpy.concatenate((walkers['index'], walkerCount + 1 + numpy.arange(released)))
+        steps = numpy.concatenate((walkers['steps'], numpy.zeros(released, dtype=int)))
+    if launched is not None:
+        for i in range(released):
+            launched(walkerCount + 1 + i if track else None, int(newX[i]), int(newY[i]))
+
+    # Walkers near the edge of the square are removed
+    nearEdge = ((y + 1) > squareSize - 5) | ((y - 1) < 1) | \
+               ((x + 1) > squareSize - 1) | ((x - 1) < 1)
+    live = numpy.flatnonzero(~nearEdge)
+    liveX = x[live]
+    liveY = y[live]
+
+    # Orientation of nearest neighbour in the cluster (-1 if none)
+    orientation = numpy.full(len(live), -1)
+    for code, (dy, dx) in enumerate(neighbourOffsets):
+        orientation[matrix[liveY + dy, liveX + dx] == 1] = code
+    # Walkers on a particle (which took their site) step off it first
+    foundFriend = (orientation >= 0) & (matrix[liveY, liveX] != 1)
+
+    # Walkers which stay in the pool without moving this step
+    stay = numpy.zeros(len(x), dtype=bool)
+
+    # Deposition of walkers touching the cluster
+    friend = numpy.flatnonzero(foundFriend)
+    friendX = liveX[friend]
+    friendY = liveY[friend]
+    friendOrientation = orientation[friend]
+    # Randomly choose crystallographic alignment of walkers
+    cell = rng.integers(1, 5, len(friend))
+    # Numbers to determine deposition of non-aligned particles
+    marker = rng.random(len(friend))
+    # Walker aligned with nearest neighbour
+    offsets = numpy.array(neighbourOffsets)[friendOrientation]
+    aligned = (alignMatrix[friendY + offsets[:, 0], friendX + offsets[:, 1]] == cell) & \
+              (cell == numpy.array(alignedCells)[friendOrientation])
+    # Only sites of silica solution away from the top of the square take particles
+    openSite = (matrix[friendY, friendX] == 4) & (friendY < (squareSize - 5))
+    passed = aligned | (marker < alignProb)
+    accept = openSite & passed
+
+    # First walker (in order of release) to reach a site deposits there
+    site = friendY*squareSize + friendX
+    winner = numpy.zeros(len(friend), dtype=bool)
+    accepted = numpy.flatnonzero(accept)
+    firstAccepted = numpy.unique(site[accepted], return_index=True)[1]
+    winner[accepted[firstAccepted]] = True
+    # Walkers after the quota is used up wait for the next step
+    waiting = (numpy.cumsum(winner) - winner) >= quota
+    winner &= ~waiting
+    stay[live[friend[waiting]]] = True
+    # Walkers which lost their site to a walker released before them stay
+    lost = accept & ~winner & ~waiting
+    stay[live[friend[lost]]] = True
+    if stats is not None:
+        ended = ~waiting & ~lost
+        stats.fate('nearEdge', int(numpy.count_nonzero(nearEdge)))
+        stats.fate('aligned', int(numpy.count_nonzero(winner & aligned)))
+        stats.fate('unaligned', int(numpy.count_nonzero(winner & ~aligned)))
+        stats.fate('rejected', int(numpy.count_nonzero(ended & openSite & ~passed)))
+        stats.fate('blocked', int(numpy.count_nonzero(ended & ~openSite)))
+        stats.fate('lost', int(numpy.count_nonzero(lost)))
+
+    depositX = friendX[winner]
+    depositY = friendY[winner]
+    matrix[depositY, depositX] = 1
+    # Update matrix of alignments
+    alignMatrix[depositY, depositX] = cell[winner]
+    deposits = None
+    if track:
+        depositWalkers = live[friend[winner]]
+        deposits = {'index': index[depositWalkers], 'alignment': cell[winner],
+                    'orientation': friendOrientation[winner], 'steps': steps[depositWalkers]}
+
+    # Walkers away from the cluster (or on it) take a random step
+    walking = numpy.flatnonzero(~foundFriend)
+    if field is not None:
+        # Deposited particles are new obstacles for jumping walkers
+        for i in range(len(depositX)):
+            depositField(field, int(depositX[i]), int(depositY[i]), squareSize)
+        # Walkers far from any obstacle jump ahead instead
+        far = field[liveY[walking], liveX[walking]] > jumpMargin
+        jumping = live[walking[far]]
+        x[jumping], y[jumping], jumps = jumpWalker(x[jumping], y[jumping], field, rng)
+        stay[jumping] = True
+        if track:
+            steps[jumping] += jumps
+        walking = walking[~far]
+    step = stepOffsets[rng.integers(0, 4, len(walking))]
+    stepX = liveX[walking] + step[:, 1]
+    stepY = liveY[walking] + step[:, 0]
+    # Forbid walking through solid silica, and onto the cluster (walker stays)
+    target = matrix[stepY, stepX]
+    inSolid = numpy.isin(target, solidCodes)
+    onCluster = target == 1
+    stay[live[walking[onCluster]]] = True
+    step = ~inSolid & ~onCluster
+    moved = live[walking[step]]
+    x[moved] = stepX[step]
+    y[moved] = stepY[step]
+    stay[moved] = True
+    if track:
+        steps[moved] += 1
+    if stats is not None:
+        stats.fate('inSolid', int(numpy.count_nonzero(inSolid)))
+
+    # Re-inject walkers above the kill height onto the launch line
+    if launchHeight is not None and killHeight(squareSize, launchHeight) > launchHeight:
+        moved = numpy.flatnonzero(stay)
+        outside = moved[y[moved] > killHeight(squareSize, launchHeight)]
+        x[outside], y[outside], valid = reinjectOnShell(x[outside], y[outside], squareSize, launchHeight, matrix, rng)
+        stay[outside[~valid]] = False
+        if stats is not None:
+            # Walkers re-injected off the square leave through its edge
+            offSquare = ~awayFromEdge(x[outside], y[outside], squareSize)
+            stats.fate('reinjected', len(outside))
+            stats.fate('nearEdge', int(numpy.count_nonzero(offSquare)))
+            stats.fate('inSolid', int(numpy.count_nonzero(~valid & ~offSquare)))
+
+    walkers = {'x': x[stay], 'y': y[stay]}
+    if track:
+        walkers['index'] = index[stay]
+        walkers['steps'] = steps[stay]
+        if stats is not None and stats.countSteps:
+            stats.walkerSteps(steps[~stay])
+
+    return (walkers, released, depositY, depositX, deposits)
+
+# Codes of the sites of the walkers in the pool (None for no pool)
+def poolSites(walkers, matrix):
+    return matrix[walkers['y'], walkers['x']] if walkers is not None else None
+
+# Take the walkers whose sites a layer changed out of the pool
+def dropBuried(walkers, sites, matrix, stats=None):
+
+    if walkers is None:
+        return walkers
+    buried = matrix[walkers['y'], walkers['x']] != sites
+    if stats is not None:
+        stats.fate('buried', int(numpy.count_nonzero(buried)))
+        if 'steps' in walkers and stats.countSteps:
+            stats.walkerSteps(walkers['steps'][buried])
+
+    return {name: values[~buried] for name, values in walkers.items()}